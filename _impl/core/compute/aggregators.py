@@ -8,21 +8,49 @@
         AverageRam - average memory consumed for renders.
         MaximumRam - peak memory availed by renders.
         MaximumCpu - maximum cpu used by renders.
+        PercentileTime - p50, p95 and p99 elapsed time of renders.
+        PercentileCpu - p50, p95 and p99 cpu used by renders.
+        PercentileRam - p50, p95 and p99 memory consumed by renders.
+        GroupedAggregator - any of the above per group of column values.
+
+    Records are aggregated either one by one (record_aggregation) or
+    as columnar batches (batch_aggregation), batches are reduced with
+    builtin sum/max over the typed column masked by the filters' selection.
+    FusedAggregation runs several aggregators over a batch at once, the
+    selected values of every column are gathered once and shared.
 """
+import collections
+import itertools
+import operator
+
 import config
+from _impl.core.compute import sketch
+from _impl.core.orm import models
 
 
 class Aggregator(object):
     """ Aggregator base class.
     """
+    # can be run by FusedAggregation on shared column values
+    fusable = True
+
     def __init__(self, aggregator_column):
         """ Initialise the aggregator column in here.
         """
         self.aggregator_column = aggregator_column
+        # resolve the column position once, records are accessed by index
+        self.aggregator_index = models.RenderStats.index(aggregator_column)
 
     def __str__(self):
         return 'Aggregator({})'.format(self.__class__.__name__)
 
+    @property
+    def columns(self):
+        """ Columns required to perform the aggregation.
+            Could be overriden in subclasses.
+        """
+        return (self.aggregator_column,)
+
     def __repr__(self):
         return str(self)
 
@@ -32,6 +60,25 @@ class Aggregator(object):
         """
         pass
 
+    def batch_aggregation(self, batch, result):
+        """ Same as record_aggregation but performed on a columnar batch.
+            Could be overriden in subclasses.
+        """
+        values = dict((column, batch.selected(column)) for column in self.columns)
+        return self.column_aggregation(values, batch.count, result)
+
+    def column_aggregation(self, values, count, result):
+        """ Same as batch_aggregation but performed on the already
+            selected values of the batch.
+            Should be overriden in subclasses.
+
+            Args:
+                values (dict): column name to the values of the selected records.
+                count (int): number of selected records.
+                result (object): first stage result so far.
+        """
+        pass
+
     def result_aggregation(self, results):
         """ Aggregation on results obtained from record_aggregation.
             Could be overriden in subclasses.
@@ -46,12 +93,24 @@ class SuccessCount(Aggregator):
     def __init__(self):
         super(SuccessCount, self).__init__(config.Columns.success)
 
+    @property
+    def columns(self):
+        """ Only the records are counted, no column is required.
+        """
+        return ()
+
     def record_aggregation(self, records, result):
         """ count the successful records
         """
         result = result or 0
         return result + len(records)
 
+    def column_aggregation(self, values, count, result):
+        """ count the successful records of the batch.
+        """
+        result = result or 0
+        return result + count
+
     def result_aggregation(self, results):
         """ sum all the counts obtained in record_aggregation.
         """
@@ -74,14 +133,22 @@ class AverageAggregator(Aggregator):
                 tuple: Pair of sum of records and length of records.
         """
         result = result or (0, 0)
-        values = []
-        for record in records:
-            for column in record.columns:
-                if column.name == self.aggregator_column:
-                    values.append(column.value)
-                    break
-        result = (sum(values + [result[0]]), len(values) + result[1])
-        return result
+        values = itertools.imap(operator.itemgetter(self.aggregator_index), records)
+        return (sum(values, result[0]), len(records) + result[1])
+
+    def column_aggregation(self, values, count, result):
+        """ Sum the column values of the selected records.
+
+            Args:
+                values (dict): column name to the values of the selected records.
+                count (int): number of selected records.
+                result (tuple): Pair of sum of records and length of records
+
+            Returns:
+                tuple: Pair of sum of records and length of records.
+        """
+        result = result or (0, 0)
+        return (sum(values[self.aggregator_column], result[0]), result[1] + count)
 
     def result_aggregation(self, results):
         """ Average out all the results got from workers.
@@ -132,13 +199,14 @@ class MaximumRam(Aggregator):
         """ Find the max ram value from provided records.
         """
         max_value = max_value or 0
-        values = []
-        for record in records:
-            for column in record.columns:
-                if column.name == self.aggregator_column:
-                    values.append(column.value)
-                    break
-        return max(values + [max_value])
+        values = itertools.imap(operator.itemgetter(self.aggregator_index), records)
+        return max(itertools.chain(values, [max_value]))
+
+    def column_aggregation(self, values, count, max_value):
+        """ Find the max value of the column of the selected records.
+        """
+        max_value = max_value or 0
+        return max(itertools.chain(values[self.aggregator_column], [max_value]))
 
     def result_aggregation(self, results):
         """ Finally, aggregate uppon the results obtained by
@@ -157,13 +225,14 @@ class MaximumCpu(Aggregator):
         """ Aggregate over the records and find the max. cpu value.
         """
         max_value = max_value or 0
-        values = []
-        for record in records:
-            for column in record.columns:
-                if column.name == self.aggregator_column:
-                    values.append(column.value)
-                    break
-        return max(values + [max_value])
+        values = itertools.imap(operator.itemgetter(self.aggregator_index), records)
+        return max(itertools.chain(values, [max_value]))
+
+    def column_aggregation(self, values, count, max_value):
+        """ Find the max value of the column of the selected records.
+        """
+        max_value = max_value or 0
+        return max(itertools.chain(values[self.aggregator_column], [max_value]))
 
     def result_aggregation(self, results):
         """ Find the max of all the results.
@@ -172,19 +241,315 @@ class MaximumCpu(Aggregator):
         return max(results)
 
 
+class PercentileAggregator(Aggregator):
+    """ Class to estimate the percentiles of render properties.
+
+        First stage results are quantile sketches (as plain data),
+        they take constant memory however many records are aggregated
+        and are merged in result_aggregation.
+    """
+
+    def record_aggregation(self, records, result):
+        """ Add the values of provided records to the sketch.
+
+            Args:
+                records (list): List of filtered recrods
+                result (tuple): sketch state, see sketch.QuantileSketch.
+
+            Returns:
+                tuple: sketch state.
+        """
+        quantile_sketch = sketch.QuantileSketch(result)
+        quantile_sketch.add(itertools.imap(operator.itemgetter(self.aggregator_index), records))
+        return quantile_sketch.state
+
+    def column_aggregation(self, values, count, result):
+        """ Add the column values of the selected records to the sketch.
+
+            Args:
+                values (dict): column name to the values of the selected records.
+                count (int): number of selected records.
+                result (tuple): sketch state, see sketch.QuantileSketch.
+
+            Returns:
+                tuple: sketch state.
+        """
+        quantile_sketch = sketch.QuantileSketch(result)
+        quantile_sketch.add(values[self.aggregator_column])
+        return quantile_sketch.state
+
+    def result_aggregation(self, results):
+        """ Merge the sketches of the workers and estimate the percentiles.
+
+            Args:
+                results (list): sketch states.
+
+            Returns:
+                tuple: estimated value per quantile of config.Quantiles.
+        """
+        quantile_sketch = sketch.merge(results)
+        return tuple(
+            quantile_sketch.quantile(quantile)
+            for quantile in config.Quantiles.quantiles
+        )
+
+
+class PercentileTime(PercentileAggregator):
+    """ Class to estimate the percentiles of elapsed time for renders.
+    """
+    def __init__(self):
+        super(PercentileTime, self).__init__(config.Columns.elapsed_time)
+
+
+class PercentileRam(PercentileAggregator):
+    """ Class to estimate the percentiles of ram used for renders.
+    """
+    def __init__(self):
+        super(PercentileRam, self).__init__(config.Columns.maxram)
+
+
+class PercentileCpu(PercentileAggregator):
+    """ Class to estimate the percentiles of cpu used for renders.
+    """
+    def __init__(self):
+        super(PercentileCpu, self).__init__(config.Columns.maxcpu)
+
+
+class GroupedAggregator(Aggregator):
+    """ Wraps an aggregator to aggregate per group of records
+        sharing the values of the group columns, e.g. per app.
+
+        First stage results are dicts of {group: first stage result
+        of the wrapped aggregator}, they are merged per group in
+        result_aggregation, so all the groups are computed in one scan.
+    """
+    fusable = False
+
+    def __init__(self, aggregator, group_columns):
+        """ Initialise the grouped aggregator.
+
+            Args:
+                aggregator (Aggregator): aggregator to be applied per group.
+                group_columns (tuple): names of the columns to group by.
+        """
+        super(GroupedAggregator, self).__init__(aggregator.aggregator_column)
+        self.aggregator = aggregator
+        self.group_columns = tuple(group_columns)
+        self.group_indices = [models.RenderStats.index(column) for column in self.group_columns]
+
+    def __str__(self):
+        return 'Aggregator(GroupBy({}) {})'.format(
+            ','.join(self.group_columns), self.aggregator.__class__.__name__
+        )
+
+    @property
+    def columns(self):
+        """ Columns of the wrapped aggregator and the group columns.
+        """
+        return tuple(self.aggregator.columns) + self.group_columns
+
+    def record_aggregation(self, records, result):
+        """ Aggregate the records per group.
+
+            Args:
+                records (list): List of filtered recrods
+                result (dict): group to first stage result.
+
+            Returns:
+                dict: group to first stage result.
+        """
+        result = result or {}
+        keys = itertools.izip(*[
+            itertools.imap(operator.itemgetter(index), records)
+            for index in self.group_indices
+        ])
+        groups = collections.defaultdict(list)
+        for key, record in itertools.izip(keys, records):
+            groups[key].append(record)
+
+        for key, group_records in groups.iteritems():
+            result[key] = self.aggregator.record_aggregation(group_records, result.get(key))
+        return result
+
+    def batch_aggregation(self, batch, result):
+        """ Aggregate the selected records of the batch per group.
+
+            Args:
+                batch (RecordBatch): batch of filtered records.
+                result (dict): group to first stage result.
+
+            Returns:
+                dict: group to first stage result.
+        """
+        groups = group_values(batch, self.group_columns, self.aggregator.columns)
+        return self.group_aggregation(groups, result)
+
+    def group_aggregation(self, groups, result):
+        """ Same as batch_aggregation but performed on the already
+            grouped values of the batch, see group_values.
+
+            Args:
+                groups (dict): group to (column name to values, count) pairs.
+                result (dict): group to first stage result.
+
+            Returns:
+                dict: group to first stage result.
+        """
+        result = result or {}
+        for key, (values, count) in groups.iteritems():
+            result[key] = self.aggregator.column_aggregation(values, count, result.get(key))
+        return result
+
+    def result_aggregation(self, results):
+        """ Merge the first stage results of every group.
+
+            Args:
+                results (list): group to first stage result dicts.
+
+            Returns:
+                OrderedDict: group to final result, sorted by the groups.
+        """
+        groups = collections.defaultdict(list)
+        for result in results:
+            for key, group_result in result.iteritems():
+                groups[key].append(group_result)
+
+        return collections.OrderedDict(
+            (key, self.aggregator.result_aggregation(groups[key]))
+            for key in sorted(groups)
+        )
+
+
+def group_values(batch, group_columns, columns):
+    """ Selected values of the columns of a batch, per group of records
+        sharing the values of the group columns.
+
+        Args:
+            batch (RecordBatch): batch of filtered records.
+            group_columns (tuple): names of the columns to group by.
+            columns (list): names of the columns to get the values of.
+
+        Returns:
+            dict: group to (column name to values, count) pairs.
+    """
+    keys = itertools.izip(*[batch.selected(column) for column in group_columns])
+    positions = collections.defaultdict(list)
+    for position, key in enumerate(keys):
+        positions[key].append(position)
+
+    selected = {}
+    for column in columns:
+        values = batch.selected(column)
+        if batch.mask is not None:
+            # shared by the aggregators, materialise once
+            values = list(values)
+        selected[column] = values
+
+    if len(positions) == 1:
+        # a single group, e.g. the batch of a single app's renders
+        key, = positions
+        return {key: (selected, batch.count)}
+    return dict(
+        (key, (dict((column, map(selected[column].__getitem__, indices)) for column in columns),
+               len(indices)))
+        for key, indices in positions.iteritems()
+    )
+
+
+class FusedAggregation(object):
+    """ Runs several aggregators in a single pass over a batch.
+
+        The selected values of every column required by the aggregators
+        are gathered once, e.g. for --summary the maxram values are shared
+        by AverageRam and MaximumRam, and every aggregator reduces over them.
+        Grouped aggregators with the same group columns share the grouping,
+        the batch is grouped once and they reduce over the values per group.
+    """
+    def __init__(self, aggregator_objs):
+        """ Initialise the fused aggregation.
+
+            Args:
+                aggregator_objs (list): list of aggregator types.
+        """
+        self.aggregator_objs = aggregator_objs
+        columns = []
+        # group columns to the columns of the grouped aggregators
+        groupings = collections.OrderedDict()
+        for aggregator in aggregator_objs:
+            if aggregator.fusable:
+                columns.extend(c for c in aggregator.columns if c not in columns)
+            elif isinstance(aggregator, GroupedAggregator):
+                grouping = groupings.setdefault(aggregator.group_columns, [])
+                grouping.extend(c for c in aggregator.aggregator.columns if c not in grouping)
+        self.columns = columns
+        self.groupings = groupings
+
+    def __str__(self):
+        return '{}({})'.format(self.__class__.__name__, self.aggregator_objs)
+
+    def batch_aggregation(self, batch, results):
+        """ First stage aggregation of the batch for all the aggregators.
+
+            Args:
+                batch (RecordBatch): batch of filtered records.
+                results (list): first stage result so far per aggregator,
+                                None if there is none yet.
+
+            Returns:
+                list: first stage result per aggregator.
+        """
+        values = {}
+        for column in self.columns:
+            selected = batch.selected(column)
+            if batch.mask is not None:
+                # shared by the aggregators, materialise once
+                selected = list(selected)
+            values[column] = selected
+
+        groups = dict(
+            (group_columns, group_values(batch, group_columns, columns))
+            for group_columns, columns in self.groupings.iteritems()
+        )
+
+        results = list(results)
+        for index, aggregator in enumerate(self.aggregator_objs):
+            if aggregator.fusable:
+                results[index] = aggregator.column_aggregation(values, batch.count, results[index])
+            elif isinstance(aggregator, GroupedAggregator):
+                results[index] = aggregator.group_aggregation(
+                    groups[aggregator.group_columns], results[index]
+                )
+            else:
+                results[index] = aggregator.batch_aggregation(batch, results[index])
+        return results
+
+
 class AggregateFactory(object):
     """ Factory class to create different type of aggregators.
     """
 
     @classmethod
-    def create(cls, typ):
+    def create(cls, typ, group_columns=()):
         """ Method creates different Aggreagator types.
+
+            Args:
+                typ (str): type of the aggregator.
+
+            Kwargs:
+                group_columns (tuple): columns to group by, the aggregator
+                                       is grouped if there are any.
         """
-        return {
+        aggregator = {
             'avgram': AverageRam,
             'avgcpu': AverageCpu,
             'avgtime': AverageTime,
             'success': SuccessCount,
             'maxram': MaximumRam,
             'maxcpu': MaximumCpu,
+            'pcttime': PercentileTime,
+            'pctcpu': PercentileCpu,
+            'pctram': PercentileRam,
         }.get(typ)()
+        if group_columns:
+            aggregator = GroupedAggregator(aggregator, group_columns)
+        return aggregator
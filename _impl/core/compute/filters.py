@@ -6,7 +6,10 @@
         RendererFilter - Filter the renders based on renderer name provided
         SuccessFilter - Include the failed renders.
 """
+import itertools
+
 import config
+from _impl.core.orm import models
 
 
 class Filter(object):
@@ -22,10 +25,21 @@ class Filter(object):
         """
         self.arg_value = arg_value
         self.filter_column = filter_column
+        # resolve the column position once, records are accessed by index
+        self.filter_index = models.RenderStats.index(filter_column)
+        # string columns don't need conversion, such filters can be
+        # pushed down to the engine and checked on the raw csv row.
+        self.pushdown = models.RenderStats.columns[self.filter_index].type_ is str
 
     def __str__(self):
         return 'Filter({})'.format(self.__class__.__name__)
 
+    @property
+    def columns(self):
+        """ Columns required to apply the filter.
+        """
+        return (self.filter_column,)
+
     def __repr__(self):
         return str(self)
 
@@ -39,9 +53,7 @@ class Filter(object):
             Return:
                 bool : provided values matches to the current column value.
         """
-        for column in record.columns:
-            if column.name == self.filter_column:
-                return self.arg_value == column.value
+        return self.arg_value == record[self.filter_index]
 
     def __call__(self, records):
         """ Invoke this method when fitler instance is called.
@@ -54,6 +66,19 @@ class Filter(object):
         """
         return filter(self.filter_func, records)
 
+    def filter_batch(self, batch):
+        """ Filter a columnar batch of records.
+
+            Args:
+                batch (RecordBatch) - batch of records to be filtered.
+
+            Returns:
+                RecordBatch : same batch with only the desired records selected.
+        """
+        values = batch.column(self.filter_column)
+        mask = bytearray(itertools.imap(self.arg_value.__eq__, values))
+        return batch.select(mask)
+
 
 class AppFilter(Filter):
     """ Class for filtering provided records based on aap.
@@ -0,0 +1,143 @@
+""" Mergeable quantile sketch with bounded memory.
+
+    Values are counted in logarithmically sized bins (as in DDSketch),
+    a bin covers (gamma^(i-1), gamma^i] where gamma is derived from the
+    relative accuracy, so any quantile is off by at most that fraction
+    of it's true value. Merging two sketches adds up their bin counts,
+    hence the result doesn't depend on how the values were split between
+    workers or the order they were merged in.
+
+    If a sketch grows beyond max bins, the lowest bins are collapsed into
+    one, only the accuracy of the lowest quantiles suffers.
+
+    A sketch is kept as plain data, a pair of zero count and {bin: count},
+    so the first stage results can be cached and sent between processes.
+"""
+import collections
+import itertools
+import math
+
+import config
+
+
+class QuantileSketch(object):
+    """ Quantile sketch over non negative values.
+    """
+
+    def __init__(self, state=None, relative_accuracy=config.Quantiles.relative_accuracy,
+                 max_bins=config.Quantiles.max_bins):
+        """ Initialise the sketch.
+
+            Kwargs:
+                state (tuple): pair of zero count and {bin: count}, it is
+                               updated in place, None starts an empty one.
+                relative_accuracy (float): relative error of the quantiles.
+                max_bins (int): maximum number of bins kept.
+        """
+        self.zeros, self.bins = state or (0, {})
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.multiplier = 1 / math.log(self.gamma)
+        self.max_bins = max_bins
+
+    def __str__(self):
+        return '{}({})'.format(self.__class__.__name__, self.count)
+
+    def __repr__(self):
+        return self.__str__()
+
+    @property
+    def state(self):
+        """ Plain data of the sketch.
+        """
+        return (self.zeros, self.bins)
+
+    @property
+    def count(self):
+        """ Number of values added.
+        """
+        return self.zeros + sum(self.bins.itervalues())
+
+    def add(self, values):
+        """ Add the values to the sketch.
+
+            Args:
+                values (Iterable): numbers to be added.
+        """
+        log = math.log
+        ceil = math.ceil
+        multiplier = self.multiplier
+        counts = collections.defaultdict(int)
+        zeros = 0
+        for value in values:
+            if value > 0:
+                counts[int(ceil(log(value) * multiplier))] += 1
+            else:
+                # e.g. empty maxram of failed renders
+                zeros += 1
+
+        self.zeros += zeros
+        bins = self.bins
+        for index, count in counts.iteritems():
+            bins[index] = bins.get(index, 0) + count
+        self.collapse()
+
+    def merge(self, other):
+        """ Add the counts of another sketch to this one.
+
+            Args:
+                other (QuantileSketch): sketch to be merged.
+        """
+        self.zeros += other.zeros
+        bins = self.bins
+        for index, count in other.bins.iteritems():
+            bins[index] = bins.get(index, 0) + count
+        self.collapse()
+
+    def collapse(self):
+        """ Collapse the lowest bins to keep max bins.
+        """
+        if len(self.bins) <= self.max_bins:
+            return
+        indices = sorted(self.bins)
+        excess = indices[:len(indices) - self.max_bins + 1]
+        count = sum(self.bins.pop(index) for index in excess)
+        self.bins[excess[-1]] = count
+
+    def quantile(self, quantile):
+        """ Estimate a quantile of the added values.
+
+            Args:
+                quantile (float): between 0 and 1, e.g. 0.95.
+
+            Returns:
+                float or None: estimated value, None if the sketch is empty.
+        """
+        count = self.count
+        if not count:
+            return None
+
+        rank = quantile * (count - 1)
+        if rank < self.zeros:
+            return 0.
+        seen = self.zeros
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # middle of the bin by relative error
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+
+def merge(states):
+    """ Merge the plain data of several sketches.
+
+        Args:
+            states (Iterable): pairs of zero count and {bin: count}.
+
+        Returns:
+            QuantileSketch: sketch holding all the counts.
+    """
+    sketch = QuantileSketch()
+    for state in itertools.ifilter(None, states):
+        sketch.merge(QuantileSketch(state))
+    return sketch
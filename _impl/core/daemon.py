@@ -0,0 +1,248 @@
+""" Long running daemon answering the queries from memory.
+
+    The records of a logs directory are retrieved once and kept as
+    columnar batches, a watcher thread reads the rows appended to the
+    data stores (and the new data stores) every poll interval.
+    Queries arrive over a unix socket (see _impl.utils.client), first
+    stage results are memoized per data store until it changes, so a
+    repeated query only runs the second stage aggregation.
+
+    WarmStore - records of the data stores held in memory.
+    QueryHandler - answers a query per connection.
+    Daemon - unix socket server.
+"""
+import ast
+import datetime
+import os
+import SocketServer
+import threading
+
+import config
+from _impl.core import workers
+from _impl.core.compute import aggregators, filters
+from _impl.utils import log, utils
+
+
+class WarmStore(object):
+    """ Records of the data stores of a logs directory held in memory.
+    """
+
+    def __init__(self, logs_dir, batch_size=config.Concurrency.batch_size):
+        """ Initialise the store, the records are loaded by refresh().
+
+            Args:
+                logs_dir (str): directory containing the data stores.
+
+            Kwargs:
+                batch_size (int): maximum number of records per batch.
+        """
+        self.logs_dir = os.path.abspath(logs_dir)
+        self.batch_size = batch_size
+        # data store to dict of
+        #   engine, offset (bytes read), batches and
+        #   partials ({(filter args, aggregator): first stage result})
+        self.stores = {}
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return '{}({}, {})'.format(self.__class__.__name__, self.logs_dir, len(self.stores))
+
+    def refresh(self):
+        """ Load the new data stores and the rows appended to the known ones.
+        """
+        found = set()
+        for engine in utils.collect_data_stores(self.logs_dir):
+            store_path = engine.store_path
+            found.add(store_path)
+            store = self.stores.get(store_path)
+            size = os.path.getsize(store_path)
+            if store is not None and store['offset'] == size:
+                continue
+
+            if store is None or size < store['offset']:
+                # new or truncated
+                store = self.load(engine)
+            else:
+                offset, batches = engine.read_appended_record_batches(
+                    store['offset'], self.batch_size
+                )
+                if offset == store['offset']:
+                    # only a partially written line so far
+                    continue
+                store = dict(store, offset=offset, batches=store['batches'] + list(batches), partials={})
+
+            log.log.info('%s loaded %s', self, store_path)
+            with self.lock:
+                self.stores[store_path] = store
+
+        with self.lock:
+            for store_path in set(self.stores) - found:
+                del self.stores[store_path]
+
+    def load(self, engine):
+        """ Load all the records of a data store.
+
+            Args:
+                engine (Engine): orm engine of the data store.
+
+            Returns:
+                dict: the loaded store.
+        """
+        batches = None
+        sidecar_ = engine.get_sidecar() if config.Sidecar.enabled else None
+        if sidecar_ is not None:
+            offset = sidecar_.header['size']
+            try:
+                batches = list(sidecar_.get_record_batches(self.batch_size, source=engine.store_path))
+            except Exception as error:
+                # replaced by a concurrent build or broken, the csv is read instead
+                log.log.warning('Unable to read %s for %s: %s', sidecar_, engine.store_path, error)
+        if batches is None:
+            offset, batches = engine.read_appended_record_batches(0, self.batch_size)
+            batches = list(batches)
+        return {
+            'engine': engine,
+            'offset': offset,
+            'batches': batches,
+            'partials': {},
+        }
+
+    def watch(self, interval=config.Daemon.poll_interval):
+        """ Keep refreshing the store in a daemon thread.
+
+            Kwargs:
+                interval (float): seconds between the refreshes.
+        """
+        def run():
+            while not stopped.wait(interval):
+                try:
+                    self.refresh()
+                except (IOError, OSError) as error:
+                    log.log.warning('%s refresh failed: %s', self, error)
+
+        stopped = threading.Event()
+        thread = threading.Thread(target=run, name='{}Watcher'.format(self.__class__.__name__))
+        thread.daemon = True
+        thread.start()
+        return stopped
+
+    def query(self, request):
+        """ Answer a query.
+
+            Args:
+                request (dict): query, see client.create_request.
+
+            Returns:
+                list: final result per aggregator.
+        """
+        if os.path.abspath(request['logs_dir']) != self.logs_dir:
+            raise ValueError('not serving {}'.format(request['logs_dir']))
+
+        filter_args = tuple(request['filter_args'])
+        filters_objs = [filters.FilterFactory.create(name, value) for name, value in filter_args]
+        aggregator_objs = [
+            aggregators.AggregateFactory.create(name, request['group_args'])
+            for name in request['aggregator_args']
+        ]
+        date_range = tuple(
+            datetime.datetime.strptime(date, config.DataStore.date_format).date() if date else None
+            for date in request['date_args']
+        )
+
+        with self.lock:
+            stores = [
+                store for store_path, store in self.stores.iteritems()
+                if utils.in_date_range(store_path, date_range)
+            ]
+        if not stores:
+            # the client falls back to the cli, which reports it
+            raise ValueError('No data stores found in {}'.format(request['logs_dir']))
+
+        partials = {}
+        for store in stores:
+            memo = store['partials']
+            keys = [(filter_args, str(aggregator)) for aggregator in aggregator_objs]
+            # the memo is shared by the concurrent queries
+            with self.lock:
+                found = dict((key, memo[key]) for key in keys if key in memo)
+            missing = [
+                aggregator for aggregator, key in zip(aggregator_objs, keys) if key not in found
+            ]
+            if missing:
+                kernel = aggregators.FusedAggregation(missing)
+                results = workers.aggregate_batches(
+                    store['batches'], filters_objs, kernel, [None] * len(missing)
+                )
+                with self.lock:
+                    if len(memo) + len(missing) > config.Daemon.max_partials:
+                        memo.clear()
+                    for aggregator, result in zip(missing, results):
+                        memo[(filter_args, str(aggregator))] = result
+                for aggregator, result in zip(missing, results):
+                    found[(filter_args, str(aggregator))] = result
+
+            partials[store['engine'].store_path] = dict(
+                (aggregator, [found[key]])
+                for aggregator, key in zip(aggregator_objs, keys)
+                if found[key] is not None
+            )
+
+        results = workers.final_results(aggregator_objs, partials.values())
+        # grouped results are ordered dicts, send them as plain ones
+        return [dict(result) if isinstance(result, dict) else result for result in results]
+
+
+class QueryHandler(SocketServer.StreamRequestHandler):
+    """ Answers a query per connection, the request and the response
+        are python literals (repr), the client closes it's side once
+        the request is sent.
+    """
+
+    def handle(self):
+        """ Read the request and write the response.
+        """
+        try:
+            request = ast.literal_eval(self.rfile.read())
+            response = {'results': self.server.store.query(request)}
+            log.log.info('%s -> %s', request, response)
+        except Exception as error:
+            log.log.exception('Query failed')
+            response = {'error': str(error)}
+        self.wfile.write(repr(response))
+
+
+class Daemon(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """ Unix socket server answering the queries on a WarmStore.
+    """
+    daemon_threads = True
+
+    def __init__(self, logs_dir, socket_path=config.Daemon.socket_path):
+        """ Load the data stores and bind the socket.
+
+            Args:
+                logs_dir (str): directory containing the data stores.
+
+            Kwargs:
+                socket_path (str): path of the unix socket.
+        """
+        self.store = WarmStore(logs_dir)
+        self.store.refresh()
+
+        if os.path.exists(socket_path):
+            # left by a daemon which didn't exit cleanly
+            os.remove(socket_path)
+        SocketServer.UnixStreamServer.__init__(self, socket_path, QueryHandler)
+        log.log.info('%s serving %s on %s', self.__class__.__name__, self.store, socket_path)
+
+    def serve(self):
+        """ Serve until interrupted.
+        """
+        stopped = self.store.watch()
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stopped.set()
+            self.server_close()
+            os.remove(self.server_address)
@@ -1,6 +1,15 @@
 """ Engine for persistent store interactions.
 """
 import csv
+import itertools
+import mmap
+import operator
+import os
+import time
+
+import config
+from _impl.core.orm import models, parser, sidecar
+from _impl.utils import log
 
 
 # May be there could be an interface to choose from different persistent stores.
@@ -8,26 +17,503 @@ import csv
 class Engine(object):
     """ Class to create the engine.
     """
-    def __init__(self, store_path, model):
+    def __init__(self, store_path, model, byte_range=None):
         """ Initialise the class.
 
             Args:
                 store_path (str): path to data store.
                 model (Model): correspoding object model.
+
+            Kwargs:
+                byte_range (tuple): (start, end) offsets aligned to the lines,
+                                    to read only a part of the data store,
+                                    see split(). None reads all of it.
         """
         self.store_path = store_path
         self.model = model
+        self.byte_range = byte_range
+
+    @property
+    def size(self):
+        """ Bytes to be read, of the byte range or the whole data store.
+        """
+        if self.byte_range is not None:
+            start, end = self.byte_range
+            return end - start
+        return os.path.getsize(self.store_path)
+
+    def split(self, range_size=config.Concurrency.range_size):
+        """ Split the data store into byte ranges aligned to the lines,
+            so they can be parsed in parallel. Their batches put together
+            are the batches of a sequential read.
+
+            Data stores with an up to date sidecar (see get_sidecar) are
+            not split, neither are the ones smaller than range size. The
+            sidecar of a split data store isn't built by reading it's ranges.
+
+            Kwargs:
+                range_size (int): bytes per range, the ranges are extended
+                                  up to the end of their last line.
+
+            Returns:
+                list: an engine per byte range.
+        """
+        size = os.path.getsize(self.store_path)
+        if self.byte_range is not None or size <= range_size:
+            return [self]
+        if config.Sidecar.enabled and not self.recently_modified():
+            if sidecar.Sidecar.load(self.store_path, self.model.schema) is not None:
+                return [self]
+
+        ranges = []
+        with open(self.store_path, 'rb') as file_handler:
+            start = 0
+            while start < size:
+                end = start + range_size
+                if end < size:
+                    # up to the end of the line the range ends in
+                    file_handler.seek(end - 1)
+                    file_handler.readline()
+                    end = file_handler.tell()
+                end = min(end, size)
+                ranges.append((start, end))
+                start = end
+
+        return [self.__class__(self.store_path, self.model, byte_range) for byte_range in ranges]
+
+    def recently_modified(self):
+        """ Check if the data store might still be written to.
+
+            Returns:
+                bool: True if modified within Sidecar config's min age.
+        """
+        return time.time() - os.path.getmtime(self.store_path) < config.Sidecar.min_age
 
-    def get_all_records(self):
+    def get_all_records(self, filters=(), projection=None):
         """ Get all the records from the data store.
 
+            Kwargs:
+                filters (list): filters pushed down to the engine, rejected
+                                rows are skipped before any conversion.
+                projection (set): names of the columns to be decoded,
+                                  None decodes all, see projection().
+
             Yield:
                 Model: the model per record.
         """
         with open(self.store_path, 'r') as file_handler:
-            records = csv.reader(file_handler)
+            records = csv.reader(self.lines(file_handler))
+            predicate = row_predicate(filters)
+            if predicate:
+                records = itertools.ifilter(predicate, records)
 
             for record in records:
-                model = self.model()
-                model.set_values(record)
-                yield model
+                yield self.model.from_values(record, projection)
+
+    def get_record_batches(self, batch_size=config.Concurrency.batch_size, filters=(), projection=None):
+        """ Get the records from the data store in columnar batches.
+
+            Served from the binary sidecar of the data store when
+            possible (see get_sidecar), otherwise parsed from the csv.
+            A byte range is always parsed from the csv.
+
+            Kwargs:
+                batch_size (int): maximum number of records per batch.
+                filters (list): filters pushed down to the engine, rejected
+                                rows are skipped before any conversion.
+                projection (set): names of the columns to be decoded,
+                                  None decodes all, see projection().
+
+            Yield:
+                RecordBatch: typed per column values for a chunk of records.
+        """
+        sidecar_ = None
+        if config.Sidecar.enabled and self.byte_range is None:
+            sidecar_ = self.get_sidecar()
+        if sidecar_ is not None:
+            batches = sidecar_.get_record_batches(
+                batch_size, filters, projection, self.store_path
+            )
+            yielded = False
+            try:
+                for batch in batches:
+                    yielded = True
+                    yield batch
+                return
+            except Exception as error:
+                # replaced by a concurrent build or broken, the csv is read
+                # instead. once batches are out, re-reading would count them twice.
+                if yielded:
+                    raise
+                log.log.warning('Unable to read %s for %s: %s', sidecar_, self.store_path, error)
+                if not isinstance(error, (IOError, OSError)):
+                    sidecar.Sidecar.discard(self.store_path)
+
+        for batch in self.read_record_batches(batch_size, filters, projection):
+            yield batch
+
+    def get_sidecar(self):
+        """ Get the sidecar of the data store, building it on the first read.
+
+            Data stores still being written to are not considered.
+
+            Returns:
+                Sidecar or None: up to date sidecar, None if not available.
+        """
+        if self.recently_modified():
+            return None
+
+        try:
+            sidecar_ = sidecar.Sidecar.load(self.store_path, self.model.schema)
+            if sidecar_ is None:
+                sidecar_ = sidecar.Sidecar.build(self.store_path, self.model.schema)
+                log.log.info('Built %s for %s', sidecar_, self.store_path)
+        except Exception as error:
+            # e.g. a malformed row, the csv is read instead. a partially
+            # built sidecar is removed by the build.
+            log.log.warning('Unable to load or build sidecar for %s: %s', self.store_path, error)
+            return None
+        return sidecar_
+
+    def read_record_batches(self, batch_size=config.Concurrency.batch_size, filters=(), projection=None):
+        """ Parse the records from the csv (or it's byte range) in columnar batches.
+
+            Kwargs:
+                batch_size (int): maximum number of records per batch.
+                filters (list): filters pushed down to the engine, rejected
+                                rows are skipped before any conversion.
+                projection (set): names of the columns to be decoded,
+                                  None decodes all, see projection().
+
+            Yield:
+                RecordBatch: typed per column values for a chunk of records.
+        """
+        with open(self.store_path, 'r') as file_handler:
+            lines = self.lines(file_handler)
+            for batch in self.parse_record_batches(lines, batch_size, filters, projection):
+                yield batch
+
+    def lines(self, file_handler, reader=config.DataStore.reader):
+        """ Lines of the data store (or it's byte range).
+
+            Args:
+                file_handler (file): the open data store.
+
+            Kwargs:
+                reader (str): mmap or file, see DataStore config.
+
+            Returns:
+                Iterable: the lines.
+        """
+        start, end = self.byte_range or (0, None)
+        if reader == 'mmap':
+            return map_lines(file_handler, start, end)
+        if self.byte_range is not None:
+            return read_lines(file_handler, start, end)
+        return file_handler
+
+    def read_appended_record_batches(self, offset, batch_size=config.Concurrency.batch_size,
+                                     filters=(), projection=None):
+        """ Parse the records appended to the csv since offset.
+
+            Only complete lines are read, a partially written last line is
+            left for the next read.
+
+            Args:
+                offset (int): byte offset to read from, e.g. returned by the
+                              previous read, 0 reads from the start.
+
+            Kwargs:
+                batch_size (int): maximum number of records per batch.
+                filters (list): filters pushed down to the engine.
+                projection (set): names of the columns to be decoded,
+                                  None decodes all, see projection().
+
+            Returns:
+                tuple(int, generator): offset past the last complete line
+                                       and the batches of the lines read.
+        """
+        with open(self.store_path, 'rb') as file_handler:
+            file_handler.seek(0, os.SEEK_END)
+            end = lines_end(file_handler, offset, file_handler.tell())
+
+        def batches():
+            # streamed in blocks, the appended rows can be a whole day's
+            with open(self.store_path, 'rb') as file_handler:
+                lines = read_lines(file_handler, offset, end)
+                for batch in self.parse_record_batches(lines, batch_size, filters, projection):
+                    yield batch
+
+        return end, batches()
+
+    def parse_record_batches(self, lines, batch_size=config.Concurrency.batch_size,
+                             filters=(), projection=None, parser_=config.DataStore.parser):
+        """ Parse csv lines in columnar batches.
+
+            Args:
+                lines (Iterable): csv lines, e.g. an open data store.
+
+            Kwargs:
+                batch_size (int): maximum number of records per batch.
+                filters (list): filters pushed down to the engine, rejected
+                                rows are skipped before any conversion.
+                projection (set): names of the columns to be decoded,
+                                  None decodes all, see projection().
+                parser_ (str): fast or csv, see DataStore config.
+
+            Returns:
+                generator: RecordBatch, typed per column values for a chunk of records.
+        """
+        if parser_ == 'fast':
+            return self.split_record_batches(lines, batch_size, filters, projection)
+        return self.read_csv_record_batches(lines, batch_size, filters, projection)
+
+    def split_record_batches(self, lines, batch_size=config.Concurrency.batch_size,
+                             filters=(), projection=None):
+        """ Parse csv lines in columnar batches with the fast path parser,
+            a chunk of lines is split at once (see parser.split_columns).
+
+            Args:
+                lines (Iterable): csv lines, e.g. an open data store.
+
+            Kwargs:
+                batch_size (int): maximum number of records per batch.
+                filters (list): filters pushed down to the engine, rejected
+                                rows are skipped before any conversion.
+                projection (set): names of the columns to be decoded,
+                                  None decodes all, see projection().
+
+            Yield:
+                RecordBatch: typed per column values for a chunk of records.
+        """
+        schema = self.model.schema
+        width = len(schema)
+        predicate = parser.column_predicate(filters)
+        # only the projected and checked columns are split out
+        indices = None
+        if projection is not None:
+            indices = set(index for index, (name, _) in enumerate(schema) if name in projection)
+            indices.update(filter_.filter_index for filter_ in filters if filter_.pushdown)
+
+        lines = iter(lines)
+        values = [[] for _ in schema]
+        size = 0
+        while True:
+            # whole chunks are split, the accepted rows beyond
+            # the batch size are carried over to the next batch
+            chunk = list(itertools.islice(lines, batch_size))
+            if chunk:
+                columns, count = parser.split_columns(chunk, width, indices)
+                if predicate:
+                    mask = predicate(columns)
+                    count = mask.count(b'\x01')
+                    columns = [
+                        None if column is None else list(itertools.compress(column, mask))
+                        for column in columns
+                    ]
+                for index, column in enumerate(columns):
+                    if column is not None:
+                        values[index].extend(column)
+                size += count
+
+            while size >= batch_size or (size and not chunk):
+                count = min(size, batch_size)
+                yield models.RecordBatch.from_columns(
+                    [column[:count] for column in values], count, schema, projection, self.store_path
+                )
+                values = [column[count:] for column in values]
+                size -= count
+
+            if not chunk:
+                break
+
+    def read_csv_record_batches(self, lines, batch_size=config.Concurrency.batch_size,
+                                filters=(), projection=None):
+        """ Parse csv lines in columnar batches, every line with csv.
+
+            Args:
+                lines (Iterable): csv lines, e.g. an open data store.
+
+            Kwargs:
+                batch_size (int): maximum number of records per batch.
+                filters (list): filters pushed down to the engine, rejected
+                                rows are skipped before any conversion.
+                projection (set): names of the columns to be decoded,
+                                  None decodes all, see projection().
+
+            Yield:
+                RecordBatch: typed per column values for a chunk of records.
+        """
+        records = csv.reader(lines)
+        predicate = row_predicate(filters)
+
+        exhausted = False
+        while not exhausted:
+            rows = []
+            # fill up the batch with accepted rows
+            while len(rows) < batch_size:
+                chunk = list(itertools.islice(records, batch_size - len(rows)))
+                if not chunk:
+                    exhausted = True
+                    break
+                rows.extend(filter(predicate, chunk) if predicate else chunk)
+
+            if rows:
+                yield models.RecordBatch.from_rows(
+                    rows, self.model.schema, projection, self.store_path
+                )
+
+
+def read_lines(file_handler, start, end, block_size=1 << 20):
+    """ Lines of a file between two offsets aligned to the lines.
+
+        Args:
+            file_handler (file): the open file.
+            start (int): offset of the first line.
+            end (int): offset past the last line.
+
+        Kwargs:
+            block_size (int): bytes read at once.
+
+        Returns:
+            Iterator: the lines.
+    """
+    def blocks():
+        file_handler.seek(start)
+        remaining = end - start
+        partial = ''
+        while remaining > 0:
+            block = file_handler.read(min(block_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            lines = (partial + block).splitlines(True)
+            # the line running into the next block
+            partial = '' if lines[-1].endswith('\n') else lines.pop()
+            yield lines
+        if partial:
+            yield [partial]
+
+    return itertools.chain.from_iterable(blocks())
+
+
+def lines_end(file_handler, start, end, block_size=1 << 16):
+    """ Offset past the last complete line of a file between two offsets,
+        searched backwards from the end.
+
+        Args:
+            file_handler (file): the open file.
+            start (int): offset of the first line.
+            end (int): offset to search back from, e.g. the size of the file.
+
+        Kwargs:
+            block_size (int): bytes read at once.
+
+        Returns:
+            int: offset past the last line break, start if there is none.
+    """
+    while end > start:
+        block_start = max(start, end - block_size)
+        file_handler.seek(block_start)
+        index = file_handler.read(end - block_start).rfind('\n')
+        if index != -1:
+            return block_start + index + 1
+        end = block_start
+    return start
+
+
+def map_lines(file_handler, start=0, end=None, window_size=config.DataStore.map_window):
+    """ Lines of a file between two offsets aligned to the lines,
+        from memory mapped windows of the file.
+
+        The rows of a window are split at once, up to it's last newline,
+        the next window starts there. Only a window is mapped at a time,
+        pages of the page cache are read without going through a file
+        object's buffers.
+
+        Args:
+            file_handler (file): the open file.
+
+        Kwargs:
+            start (int): offset of the first line.
+            end (int): offset past the last line, None for the end of file.
+            window_size (int): bytes mapped at once, grown for longer lines.
+
+        Returns:
+            Iterator: the lines.
+    """
+    fileno = file_handler.fileno()
+    size = os.fstat(fileno).st_size
+    end = size if end is None else min(end, size)
+
+    def windows():
+        position = start
+        while position < end:
+            # mapped windows start on the allocation granularity
+            offset = position - position % mmap.ALLOCATIONGRANULARITY
+            length = window_size
+            while True:
+                length = min(length, end - offset)
+                mapped = mmap.mmap(fileno, length, access=mmap.ACCESS_READ, offset=offset)
+                try:
+                    if offset + length == end:
+                        stop = length
+                    else:
+                        stop = mapped.rfind('\n', position - offset, length) + 1
+                    if stop:
+                        lines = mapped[position - offset:stop].splitlines(True)
+                        break
+                finally:
+                    mapped.close()
+                # a line longer than the window
+                length *= 2
+
+            position = offset + stop
+            yield lines
+
+    return itertools.chain.from_iterable(windows())
+
+
+def projection(objs):
+    """ Columns required to be decoded for the query.
+
+        Args:
+            objs (list): Filter and Aggregator objects, the ones evaluated
+                         after retrieval, each exposing required columns.
+
+        Returns:
+            set: names of the required columns.
+    """
+    return set(column for obj in objs for column in obj.columns)
+
+
+def row_predicate(filters):
+    """ Combine the filters into a single check on raw csv rows.
+
+        Only the filters on string columns (filter.pushdown) are considered,
+        as their raw values can be compared without conversion.
+
+        Args:
+            filters (list): list of Filter objects.
+
+        Returns:
+            callable or None: returns True for the accepted rows,
+                              None if there is nothing to check.
+    """
+    filters = [filter_ for filter_ in filters if filter_.pushdown]
+    if not filters:
+        return None
+
+    # a single itemgetter call per row fetches all the checked values.
+    getter = operator.itemgetter(*[filter_.filter_index for filter_ in filters])
+    expected = tuple(filter_.arg_value for filter_ in filters)
+    if len(filters) == 1:
+        expected = expected[0]
+
+    def predicate(row):
+        try:
+            return getter(row) == expected
+        except IndexError:
+            # keep the malformed row, conversion will report it.
+            return True
+    return predicate
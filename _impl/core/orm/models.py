@@ -1,90 +1,342 @@
 """ Module contains all the persistent store models.
 """
+import array
+import collections
 import itertools
+import operator
 
 import config
 
 
-class Model(object):
+class Column(object):
+    """ Model's column.
+
+        Describes position, name and type of a value in the record,
+        created once per model class instead of once per record.
+    """
+
+    def __init__(self, index, name, type_):
+        """ Create a column.
+
+            Args:
+                index (int): index for the column
+                name (str): name of the column.
+                type_(type): supported type of value for the column.
+        """
+        self.index = index
+        self.name = name
+        self.type_ = type_
+
+    def __str__(self):
+        return '{}({}, {})'.format(self.__class__.__name__, self.index, self.name)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def convert(self, value):
+        """ Convert the raw value to column's type.
+
+            Args:
+                value (object): raw value.
+
+            Returns:
+                object: value of column's type, empty values are kept as is.
+        """
+        if value and type(value) is not self.type_:
+            value = self.type_(value)
+        return value
+
+
+def create_columns(schema):
+    """ Create the columns of a model.
+
+        Args:
+            schema (list): (name, type) pairs of the columns.
+
+        Returns:
+            tuple: Column per schema entry.
+    """
+    return tuple(
+        Column(index, name, type_)
+        for index, (name, type_) in enumerate(schema)
+    )
+
+
+class Model(tuple):
     """ Base model class for persistent data model.
+
+        A record is an immutable tuple of the column values,
+        columns are resolved at class level, so positional access
+        (record[index]) is all that is needed per record.
     """
-    def __init__(self):
-        self._name = None
-        self._columns = []
+    __slots__ = ()
+
+    # sequence of (name, type) pairs describing the columns of the model.
+    schema = None
+    # Column objects, should be set with create_columns in subclasses.
+    columns = None
 
     def __str__(self):
-        return '{}({})'.format(
-            self.__class__.__name__,
-            self.columns[0].value
-        )
+        return '{}({})'.format(self.__class__.__name__, self[0])
 
     def __repr__(self):
         return self.__str__()
 
-    @property
-    def columns(self):
-        """ All columns in of the model.
+    @classmethod
+    def index(cls, name):
+        """ Get the position of a column in the record.
+
+            Args:
+                name (str): name of the column.
+
+            Returns:
+                int: index of the column.
         """
-        if not self._columns:
+        if not cls.columns:
             raise ValueError('There are no columns defined for this model.')
-        return self._columns
+        for column in cls.columns:
+            if column.name == name:
+                return column.index
+        raise ValueError('There is no column named {}.'.format(name))
 
-    def add_column(self, column):
-        """ Add column to the model.
+    @classmethod
+    def from_values(cls, values, projection=None):
+        """ Create a record from raw values.
 
             Args:
-                column (Column): column to be added in the model.
+                values (list) : raw values of the record based on indices.
+
+            Kwargs:
+                projection (set): names of the columns to be decoded,
+                                  others are set to None. None decodes all.
+
+            Returns:
+                Model: the record.
         """
-        self._columns.append(column)
+        if not cls.columns:
+            raise ValueError('There are no columns defined for this model.')
+        if len(values) != len(cls.columns):
+            raise ValueError("Length of values don't match to columns length.")
+        if projection is None:
+            return tuple.__new__(cls, itertools.imap(
+                Column.convert, cls.columns, values
+            ))
+        return tuple.__new__(cls, [
+            column.convert(value) if column.name in projection else None
+            for column, value in itertools.izip(cls.columns, values)
+        ])
 
-    def set_values(self, values):
-        """ Set column values.
+    def get(self, name):
+        """ Get the value of a column by name.
 
             Args:
-                values (list) : add these values to model based on indices.
+                name (str): name of the column.
+
+            Returns:
+                object: value of the column.
         """
-        if len(values) != len(self.columns):
-            raise ValueError("Length of values don't match to columns length.")
-        for column, value in itertools.izip(self.columns, values):
-            column.value = value
+        return self[self.index(name)]
 
 
-class Column(object):
-    """ Model's column
+class RenderStats(Model):
+    """ Render stats model.
     """
+    __slots__ = ()
 
-    def __init__(self, index, name, type_):
-        """ Create a column.
+    schema = config.Columns.all_
+    columns = create_columns(schema)
+
+
+# array type codes for the numeric column types,
+# any other type is stored in a plain list.
+typecodes = {
+    int: 'l',
+    float: 'd',
+}
+
+
+def new_column(type_, values=()):
+    """ Create a typed column container.
+
+        Args:
+            type_ (type): type of the column values.
+
+        Kwargs:
+            values (Iterable): values already converted to type_.
+
+        Returns:
+            array.array or list: container for the column values.
+    """
+    typecode = typecodes.get(type_)
+    if typecode is None:
+        return list(values)
+    return array.array(typecode, values)
+
+
+def convert_column(type_, values):
+    """ Convert raw string values of a column in one go.
+
+        Empty values (e.g. maxram of a failed render) of numeric
+        columns are stored as 0 since typed arrays can't hold None.
+
+        Args:
+            type_ (type): type of the column values.
+            values (Sequence): raw string values.
+
+        Returns:
+            array.array or list: converted column.
+    """
+    if type_ is str:
+        return list(values)
+    try:
+        converted = map(type_, values)
+    except ValueError:
+        converted = [type_(value) if value else 0 for value in values]
+    return new_column(type_, converted)
+
+
+class RecordBatch(object):
+    """ Columnar chunk of records.
+
+        Instead of a model object per record, a batch keeps
+        a typed container per column, for instance maxram values
+        live in a single array.array('d').
+
+        Filtering doesn't copy the columns, it narrows down the
+        selection mask (a bytearray with 1 per selected record) and
+        consumers reduce over the selected values only.
+    """
+    def __init__(self, schema, columns, size, mask=None, source=None):
+        """ Initialise the batch.
+
+            Args:
+                schema (list): (name, type) pairs of the columns.
+                columns (OrderedDict): column name to it's values.
+                size (int): number of records in the batch.
+
+            Kwargs:
+                mask (bytearray): selection mask, None selects all the records.
+                source (str): data store the records are read from.
+        """
+        self.schema = schema
+        self.columns = columns
+        self.size = size
+        self.mask = mask
+        self.source = source
+        self.count = size if mask is None else mask.count(b'\x01')
+
+    def __str__(self):
+        return '{}({}/{})'.format(self.__class__.__name__, self.count, self.size)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def from_rows(cls, rows, schema, projection=None, source=None):
+        """ Create a batch out of raw csv rows.
+
+            Args:
+                rows (list): list of raw rows (list of str).
+                schema (list): (name, type) pairs of the columns.
+
+            Kwargs:
+                projection (set): names of the columns to be decoded,
+                                  None decodes all the columns.
+                source (str): data store the rows are read from.
+
+            Returns:
+                RecordBatch: batch containing the (projected) columns of rows.
+        """
+        for row in rows:
+            if len(row) != len(schema):
+                raise ValueError("Length of values don't match to columns length.")
+
+        values = [
+            map(operator.itemgetter(index), rows)
+            if projection is None or name in projection else None
+            for index, (name, _) in enumerate(schema)
+        ]
+        return cls.from_columns(values, len(rows), schema, projection, source)
+
+    @classmethod
+    def from_columns(cls, values, size, schema, projection=None, source=None):
+        """ Create a batch out of raw csv columns.
+
+            Args:
+                values (list): raw values (list of str) per column of the
+                               schema, may be None for the ones not projected.
+                size (int): number of records.
+                schema (list): (name, type) pairs of the columns.
+
+            Kwargs:
+                projection (set): names of the columns to be decoded,
+                                  None decodes all the columns.
+                source (str): data store the values are read from.
+
+            Returns:
+                RecordBatch: batch containing the (projected) columns.
+        """
+        columns = collections.OrderedDict()
+        projected_schema = []
+        for index, (name, type_) in enumerate(schema):
+            if projection is not None and name not in projection:
+                continue
+            columns[name] = convert_column(type_, values[index])
+            projected_schema.append((name, type_))
+        return cls(projected_schema, columns, size, source=source)
+
+    def column(self, name):
+        """ Get values of a column.
 
             Args:
-                index (int): index for the column
                 name (str): name of the column.
-                type_(type): supported type of value for the column.
+
+            Returns:
+                array.array or list: values of the column.
         """
-        self.index = index
-        self.name = name
-        self.type_ = type_
-        self._value = None
+        return self.columns[name]
 
-    @property
-    def value(self):
-        """ Get the column's value
+    def take(self, indices):
+        """ Create a new batch containing only the given records.
+
+            Args:
+                indices (list): indices of the records to keep.
+
+            Returns:
+                RecordBatch: batch with selected records.
         """
-        return self._value
+        columns = collections.OrderedDict()
+        for (name, type_) in self.schema:
+            values = self.columns[name]
+            columns[name] = new_column(type_, [values[index] for index in indices])
+        return RecordBatch(self.schema, columns, len(indices), source=self.source)
+
+    def select(self, mask):
+        """ Narrow down the selected records, columns are shared not copied.
 
-    @value.setter
-    def value(self, value):
-        """ Set the column's value
+            Args:
+                mask (bytearray): 1 for the records to keep, 0 otherwise.
+
+            Returns:
+                RecordBatch: batch with the combined selection mask.
         """
-        if all([value, type(value) != self.type_]):
-            value = self.type_(value)
-        self._value = value
+        if self.mask is not None:
+            mask = bytearray(itertools.imap(operator.and_, self.mask, mask))
+        return RecordBatch(self.schema, self.columns, self.size, mask, self.source)
 
+    def selected(self, name):
+        """ Get the values of selected records for a column.
 
-class RenderStats(Model):
-    """ Render stats model.
-    """
-    def __init__(self):
-        super(RenderStats, self).__init__()
-        for index, (name, typ) in enumerate(config.Columns.all_):
-            self.add_column(Column(index, name, typ))
+            Args:
+                name (str): name of the column.
+
+            Returns:
+                Iterable: values of the column for selected records.
+        """
+        values = self.columns[name]
+        if self.mask is None:
+            return values
+        return itertools.compress(values, self.mask)
@@ -0,0 +1,103 @@
+""" Fast path parser of the csv data stores.
+
+    The render logs have a fixed number of simple unquoted fields, so
+    a chunk of lines is split in bulk: the lines are joined with the
+    field delimiter and split once, the values of a column are then a
+    slice (every width-th value). Only the requested columns are sliced.
+
+    Chunks with quotes, or lines with a different number of fields,
+    are split line by line and the quoted lines go through csv.
+"""
+import csv
+import itertools
+import operator
+
+
+def split_columns(lines, width, indices=None):
+    """ Split csv lines into columns of raw values.
+
+        Args:
+            lines (list): csv lines, each ending with a line break but the last.
+            width (int): number of fields per line.
+
+        Kwargs:
+            indices (set): indices of the columns needed, None for all.
+
+        Returns:
+            tuple(list, int): raw values (list of str) per column index,
+                              None for the ones not needed, and number
+                              of rows.
+
+        Raises:
+            ValueError: if a line doesn't have width fields.
+    """
+    indices = range(width) if indices is None else sorted(indices)
+    text = ''.join(lines)
+    rows = text.splitlines()
+    count = len(rows)
+
+    delimiters = set(itertools.imap(str.count, rows, itertools.repeat(',', count)))
+    if '"' in text or (count and delimiters != set([width - 1])):
+        return split_rows(lines, width, indices), len(lines)
+
+    fields = ','.join(rows).split(',')
+    columns = [None] * width
+    for index in indices:
+        columns[index] = fields[index::width]
+    return columns, count
+
+
+def split_rows(lines, width, indices):
+    """ Split csv lines one at a time, quoted lines through csv.
+
+        Args:
+            lines (list): csv lines.
+            width (int): number of fields per line.
+            indices (list): indices of the columns needed.
+
+        Returns:
+            list: raw values (list of str) per column index,
+                  None for the ones not needed.
+
+        Raises:
+            ValueError: if a line doesn't have width fields.
+    """
+    rows = [
+        next(csv.reader([line]), []) if '"' in line else line.rstrip('\r\n').split(',')
+        for line in lines
+    ]
+    for row in rows:
+        if len(row) != width:
+            raise ValueError("Length of values don't match to columns length.")
+
+    columns = [None] * width
+    for index in indices:
+        columns[index] = map(operator.itemgetter(index), rows)
+    return columns
+
+
+def column_predicate(filters):
+    """ Combine the filters into a single check on raw columns,
+        the columnar counterpart of engine.row_predicate.
+
+        Args:
+            filters (list): list of Filter objects.
+
+        Returns:
+            callable or None: returns the selection mask (bytearray) of
+                              a list of raw columns, None if there is
+                              nothing to check.
+    """
+    filters = [filter_ for filter_ in filters if filter_.pushdown]
+    if not filters:
+        return None
+
+    def predicate(columns):
+        mask = None
+        for filter_ in filters:
+            selected = bytearray(itertools.imap(
+                operator.eq, columns[filter_.filter_index], itertools.repeat(filter_.arg_value)
+            ))
+            mask = selected if mask is None else bytearray(itertools.imap(operator.and_, mask, selected))
+        return mask
+    return predicate
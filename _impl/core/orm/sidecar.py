@@ -0,0 +1,407 @@
+""" Binary columnar sidecar of a csv data store.
+
+    Daily data stores never change once the day is over, so instead of
+    parsing the csv text on every query the engine writes a sidecar on
+    the first read and memory maps it afterwards.
+
+    A sidecar is a directory (named after the hash of the data store path)
+    containing
+        header.json - size and modified time of the csv it was built from,
+                      number of rows and the typecode of every column.
+        <column>.bin - fixed width values of the column, numeric columns
+                       are stored as is, string columns as codes into
+                       the column's dictionary.
+        <column>.dict.json - dictionary of a string column.
+"""
+import array
+import collections
+import hashlib
+import itertools
+import json
+import mmap
+import operator
+import os
+import shutil
+import tempfile
+import time
+
+import config
+from _impl.core.orm import models, parser
+
+
+version = 2
+
+# dictionaries are json, their values (str, any bytes) go through
+# latin-1, which maps every byte to a character and back.
+dictionary_encoding = 'latin-1'
+
+# typecode of the dictionary codes of string columns
+code_typecode = 'I'
+
+# prefix of the stale sidecars moved aside
+stale_prefix = 'stale.'
+
+
+class Sidecar(object):
+    """ Read access to a sidecar.
+    """
+
+    def __init__(self, path, header, schema):
+        """ Initialise the sidecar.
+
+            Args:
+                path (str): directory of the sidecar.
+                header (dict): contents of header.json.
+                schema (list): (name, type) pairs of the columns.
+        """
+        self.path = path
+        self.header = header
+        self.schema = schema
+        self.rows = header['rows']
+        self.typecodes = dict(
+            (column['name'], column['typecode']) for column in header['columns']
+        )
+        self.dictionaries = {}
+
+    def __str__(self):
+        return '{}({})'.format(self.__class__.__name__, self.path)
+
+    def __repr__(self):
+        return self.__str__()
+
+    @classmethod
+    def location(cls, store_path, root=config.Sidecar.persistence_path):
+        """ Directory of the sidecar for a data store.
+
+            Args:
+                store_path (str): path of the data store.
+
+            Kwargs:
+                root (str): directory containing all the sidecars.
+
+            Returns:
+                str: path of the sidecar directory.
+        """
+        name = hashlib.md5(os.path.abspath(store_path)).hexdigest()
+        return os.path.join(root, name)
+
+    @classmethod
+    def load(cls, store_path, schema, root=config.Sidecar.persistence_path):
+        """ Load the sidecar if it is present and up to date.
+
+            Args:
+                store_path (str): path of the data store.
+                schema (list): (name, type) pairs of the columns.
+
+            Kwargs:
+                root (str): directory containing all the sidecars.
+
+            Returns:
+                Sidecar or None: sidecar, None if missing or stale.
+        """
+        path = cls.location(store_path, root)
+        try:
+            with open(os.path.join(path, 'header.json')) as header_file:
+                header = json.load(header_file)
+        except (IOError, ValueError):
+            return None
+
+        stat = os.stat(store_path)
+        valid = all([
+            header.get('version') == version,
+            header.get('size') == stat.st_size,
+            header.get('mtime') == stat.st_mtime,
+            [column['name'] for column in header['columns']] == [name for name, _ in schema],
+            all(
+                array.array(column['typecode']).itemsize == column['itemsize']
+                for column in header['columns']
+            ),
+        ])
+        if not valid:
+            return None
+        return cls(path, header, schema)
+
+    @classmethod
+    def build(cls, store_path, schema, root=config.Sidecar.persistence_path,
+              batch_size=config.Concurrency.batch_size):
+        """ Build the sidecar of a data store.
+
+            Args:
+                store_path (str): path of the data store.
+                schema (list): (name, type) pairs of the columns.
+
+            Kwargs:
+                root (str): directory containing all the sidecars.
+                batch_size (int): rows converted at once.
+
+            Returns:
+                Sidecar or None: the sidecar, None if the data store
+                                 changed while building it.
+        """
+        if not os.path.isdir(root):
+            try:
+                os.makedirs(root)
+            except OSError:
+                # created by a concurrent build
+                pass
+
+        stat = os.stat(store_path)
+        # build in a temporary directory and move it in place once done,
+        # readers never see a partially written sidecar.
+        temp_path = tempfile.mkdtemp(dir=root)
+        try:
+            rows, dictionaries = cls._write_columns(temp_path, store_path, schema, batch_size)
+
+            header = {
+                'version': version,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'rows': rows,
+                'columns': [],
+            }
+            for name, type_ in schema:
+                typecode = models.typecodes.get(type_, code_typecode)
+                header['columns'].append({
+                    'name': name,
+                    'typecode': typecode,
+                    'itemsize': array.array(typecode).itemsize,
+                })
+                if name in dictionaries:
+                    with open(os.path.join(temp_path, name + '.dict.json'), 'w') as dict_file:
+                        json.dump(dictionaries[name], dict_file, encoding=dictionary_encoding)
+
+            with open(os.path.join(temp_path, 'header.json'), 'w') as header_file:
+                json.dump(header, header_file)
+
+            latest = os.stat(store_path)
+            if (latest.st_size, latest.st_mtime) != (stat.st_size, stat.st_mtime):
+                return None
+
+            # built by a concurrent build meanwhile
+            sidecar_ = cls.load(store_path, schema, root)
+            if sidecar_ is not None:
+                return sidecar_
+
+            path = cls.location(store_path, root)
+            cls.discard(store_path, root)
+            try:
+                os.rename(temp_path, path)
+            except OSError:
+                # moved in place by a concurrent build
+                pass
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+        return cls.load(store_path, schema, root)
+
+    @classmethod
+    def discard(cls, store_path, root=config.Sidecar.persistence_path):
+        """ Move the sidecar of a data store aside, e.g. a stale or broken one.
+            It's moved rather than deleted, readers that opened it can still
+            finish with it, see remove_stale.
+
+            Args:
+                store_path (str): path of the data store.
+
+            Kwargs:
+                root (str): directory containing all the sidecars.
+        """
+        path = cls.location(store_path, root)
+        if not os.path.isdir(path):
+            return
+
+        cls.remove_stale(root)
+        aside = tempfile.mkdtemp(prefix=stale_prefix, dir=root)
+        try:
+            os.rename(path, aside)
+            # aged from now on
+            os.utime(aside, None)
+        except OSError:
+            # moved aside by a concurrent build
+            pass
+
+    @classmethod
+    def remove_stale(cls, root=config.Sidecar.persistence_path, min_age=config.Sidecar.min_age):
+        """ Remove the stale sidecars moved aside by the builds (see build),
+            once no reader is expected to be using them.
+
+            Kwargs:
+                root (str): directory containing all the sidecars.
+                min_age (int): seconds since being moved aside.
+        """
+        now = time.time()
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            try:
+                if name.startswith(stale_prefix) and now - os.path.getmtime(path) > min_age:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                # removed by a concurrent build
+                continue
+
+    @classmethod
+    def _write_columns(cls, path, store_path, schema, batch_size):
+        """ Convert the csv and write the column files.
+
+            Args:
+                path (str): directory to write the columns in.
+                store_path (str): path of the data store.
+                schema (list): (name, type) pairs of the columns.
+                batch_size (int): rows converted at once.
+
+            Returns:
+                tuple(int, dict): number of rows and the dictionaries
+                                  (list of values) of string columns.
+        """
+        lookups = dict((name, {}) for name, type_ in schema if type_ not in models.typecodes)
+        dictionaries = dict((name, []) for name in lookups)
+        column_files = dict(
+            (name, open(os.path.join(path, name + '.bin'), 'wb')) for name, _ in schema
+        )
+        rows = 0
+        try:
+            with open(store_path, 'r') as file_handler:
+                while True:
+                    chunk = list(itertools.islice(file_handler, batch_size))
+                    if not chunk:
+                        break
+                    values, count = parser.split_columns(chunk, len(schema))
+                    rows += count
+
+                    batch = models.RecordBatch.from_columns(values, count, schema)
+                    for name, values in batch.columns.iteritems():
+                        if name in lookups:
+                            values = array.array(code_typecode, [
+                                encode(lookups[name], dictionaries[name], value)
+                                for value in values
+                            ])
+                        values.tofile(column_files[name])
+        finally:
+            for column_file in column_files.itervalues():
+                column_file.close()
+        return rows, dictionaries
+
+    def dictionary(self, name):
+        """ Dictionary of a string column.
+
+            Args:
+                name (str): name of the column.
+
+            Returns:
+                list: values of the column indexed by their codes.
+        """
+        if name not in self.dictionaries:
+            with open(os.path.join(self.path, name + '.dict.json')) as dict_file:
+                # json gives back unicode, columns hold str
+                self.dictionaries[name] = [
+                    value.encode(dictionary_encoding) for value in json.load(dict_file)
+                ]
+        return self.dictionaries[name]
+
+    def get_record_batches(self, batch_size=config.Concurrency.batch_size, filters=(),
+                           projection=None, source=None):
+        """ Get the records in columnar batches from the memory mapped columns.
+
+            Kwargs:
+                batch_size (int): maximum number of records per batch.
+                filters (list): filters pushed down to the sidecar, they are
+                                checked against the dictionary codes.
+                projection (set): names of the columns to be decoded,
+                                  None decodes all.
+                source (str): data store the sidecar belongs to.
+
+            Yield:
+                RecordBatch: typed per column values for a chunk of records,
+                             rejected records are masked out.
+        """
+        if not self.rows:
+            return
+
+        # filters are resolved to dictionary codes
+        checks = []
+        for filter_ in filters:
+            if not filter_.pushdown:
+                continue
+            dictionary = self.dictionary(filter_.filter_column)
+            if filter_.arg_value not in dictionary:
+                # no record can match
+                return
+            checks.append((filter_.filter_column, dictionary.index(filter_.arg_value)))
+
+        schema = [
+            (name, type_) for name, type_ in self.schema
+            if projection is None or name in projection
+        ]
+        names = set(name for name, _ in schema) | set(name for name, _ in checks)
+        maps = {}
+        try:
+            # every file is opened before the first batch, a sidecar
+            # moved aside meanwhile fails before yielding anything.
+            for name, type_ in schema:
+                if type_ not in models.typecodes:
+                    self.dictionary(name)
+            for name in names:
+                with open(os.path.join(self.path, name + '.bin'), 'rb') as column_file:
+                    maps[name] = mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            for start in xrange(0, self.rows, batch_size):
+                end = min(start + batch_size, self.rows)
+
+                mask = None
+                for name, code in checks:
+                    codes = self.read(maps[name], name, start, end)
+                    check = bytearray(itertools.imap(operator.eq, itertools.repeat(code), codes))
+                    if mask is not None:
+                        check = bytearray(itertools.imap(operator.and_, mask, check))
+                    mask = check
+                if mask is not None:
+                    count = mask.count(b'\x01')
+                    if not count:
+                        continue
+                    if count == end - start:
+                        mask = None
+
+                columns = collections.OrderedDict()
+                for name, type_ in schema:
+                    values = self.read(maps[name], name, start, end)
+                    if type_ not in models.typecodes:
+                        values = map(self.dictionary(name).__getitem__, values)
+                    columns[name] = values
+                yield models.RecordBatch(schema, columns, end - start, mask, source)
+        finally:
+            for map_ in maps.itervalues():
+                map_.close()
+
+    def read(self, map_, name, start, end):
+        """ Read a range of values of a column.
+
+            Args:
+                map_ (mmap): memory mapped column file.
+                name (str): name of the column.
+                start (int): index of the first record.
+                end (int): index past the last record.
+
+            Returns:
+                array.array: values of the column.
+        """
+        values = array.array(self.typecodes[name])
+        values.fromstring(map_[start * values.itemsize: end * values.itemsize])
+        return values
+
+
+def encode(lookup, dictionary, value):
+    """ Dictionary code of a value, adding it to the dictionary if required.
+
+        Args:
+            lookup (dict): value to code.
+            dictionary (list): values indexed by their codes.
+            value (str): value to be encoded.
+
+        Returns:
+            int: code of the value.
+    """
+    code = lookup.get(value)
+    if code is None:
+        code = lookup[value] = len(dictionary)
+        dictionary.append(value)
+    return code
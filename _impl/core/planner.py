@@ -0,0 +1,178 @@
+""" Sizing of the concurrency of a run (--concurrency).
+
+    static - the Concurrency config as it is.
+    auto - sized from the cpu count, the number and total size of
+           the data stores and the storage they are on. While the
+           thread pools run, workers.Tuner adjusts the plan from the
+           observed throughput and queue depths.
+
+    The chosen plan is logged, so auto runs can be compared
+    with the manual settings.
+"""
+import multiprocessing
+import os
+
+import config
+
+
+class Plan(object):
+    """ Worker counts and batch sizes of a run.
+    """
+
+    def __init__(self, retriever_threads=config.Concurrency.retriever_threads,
+                 filter_threads=config.Concurrency.filter_threads,
+                 aggregator_threads=config.Concurrency.aggregator_threads,
+                 processes=config.Concurrency.processes,
+                 batch_size=config.Concurrency.batch_size,
+                 prefetch_count=config.Concurrency.prefetch_count,
+                 queue_size=config.Concurrency.queue_size):
+        """ Initialise the plan, defaults are the Concurrency config.
+
+            Kwargs:
+                retriever_threads (int): number of retrieval workers.
+                filter_threads (int): number of filter workers.
+                aggregator_threads (int): number of aggregator workers.
+                processes (int): worker processes of the process executor.
+                batch_size (int): records per batch.
+                prefetch_count (int): batches a consumer gets at once.
+                queue_size (int): maximum batches buffered between two stages.
+        """
+        self.retriever_threads = retriever_threads
+        self.filter_threads = filter_threads
+        self.aggregator_threads = aggregator_threads
+        self.processes = processes
+        self.batch_size = batch_size
+        self.prefetch_count = prefetch_count
+        self.queue_size = queue_size
+        # what the plan was sized from, logged along with it
+        self.inputs = {}
+
+    def __str__(self):
+        return '{}(retrievers={}, filters={}, aggregators={}, processes={}, ' \
+               'batch_size={}, prefetch_count={}, queue_size={}){}'.format(
+                   self.__class__.__name__, self.retriever_threads, self.filter_threads,
+                   self.aggregator_threads, self.processes, self.batch_size,
+                   self.prefetch_count, self.queue_size,
+                   ' from {}'.format(self.inputs) if self.inputs else '',
+               )
+
+
+def create(mode, engines, filters=()):
+    """ Create the plan of a run.
+
+        Args:
+            mode (str): static or auto.
+            engines (list): orm engines of the data stores (or their byte
+                            ranges) to be scanned, see utils.schedule.
+
+        Kwargs:
+            filters (list): filters applied after retrieval.
+
+        Returns:
+            Plan: the plan.
+    """
+    if mode == 'auto':
+        return auto_plan(engines, filters)
+    return Plan()
+
+
+def auto_plan(engines, filters=()):
+    """ Size the plan from the machine and the data stores.
+
+        Args:
+            engines (list): orm engines of the data stores (or their byte
+                            ranges) to be scanned, see utils.schedule.
+
+        Kwargs:
+            filters (list): filters applied after retrieval.
+
+        Returns:
+            Plan: the plan.
+    """
+    cpus = multiprocessing.cpu_count()
+    stores = len(set(engine.store_path for engine in engines))
+    # large data stores are read in byte ranges
+    units = len(engines)
+    total_bytes = sum(engine.size for engine in engines)
+    storage = storage_type(engines[0].store_path) if engines else 'unknown'
+
+    # a worker per data store (or byte range) at most, a spinning
+    # disk only slows down with more than a couple of readers
+    readers = min(units, config.Concurrency.max_threads)
+    if storage == 'hdd':
+        readers = min(readers, 2)
+    retrievers = max(1, min(readers, cpus))
+    # the later stages are cheaper per record than parsing
+    filters_ = max(1, retrievers // 2) if filters else 1
+    aggregators = max(1, retrievers // 2)
+
+    # a few batches per retriever, so the stages overlap
+    # even on small inputs, large batches otherwise
+    rows = total_bytes // config.Concurrency.row_bytes
+    batch_size = clamp(
+        power_of_two(rows // (retrievers * 8)),
+        config.Concurrency.min_batch_size, config.Concurrency.max_batch_size
+    )
+    # about as many records in flight whatever the batch size
+    prefetch_count = clamp(32768 // batch_size, 1, config.Concurrency.max_prefetch_count)
+    queue_size = clamp(262144 // batch_size, 4, 64)
+
+    plan = Plan(
+        retriever_threads=retrievers,
+        filter_threads=filters_,
+        aggregator_threads=aggregators,
+        processes=max(1, min(cpus, readers)),
+        batch_size=batch_size,
+        prefetch_count=prefetch_count,
+        queue_size=queue_size,
+    )
+    plan.inputs = {
+        'cpus': cpus, 'data_stores': stores, 'units': units, 'bytes': total_bytes, 'storage': storage
+    }
+    return plan
+
+
+def storage_type(path):
+    """ Storage type of the device a file is on, from sysfs (linux).
+
+        Args:
+            path (str): path of the file.
+
+        Returns:
+            str: hdd, ssd or unknown (e.g. network or in memory file systems).
+    """
+    try:
+        device = os.stat(path).st_dev
+    except OSError:
+        return 'unknown'
+
+    block = os.path.realpath('/sys/dev/block/{}:{}'.format(os.major(device), os.minor(device)))
+    # a partition's queue is on it's disk
+    for queue in (block, os.path.dirname(block)):
+        try:
+            with open(os.path.join(queue, 'queue', 'rotational')) as rotational:
+                return 'hdd' if rotational.read().strip() == '1' else 'ssd'
+        except IOError:
+            continue
+    return 'unknown'
+
+
+def power_of_two(value):
+    """ Largest power of two not above the value (1 at least).
+
+        Args:
+            value (int): the value.
+
+        Returns:
+            int: power of two.
+    """
+    power = 1
+    while power * 2 <= value:
+        power *= 2
+    return power
+
+
+def clamp(value, lowest, highest):
+    """ Limit the value to [lowest, highest].
+    """
+    return max(lowest, min(value, highest))
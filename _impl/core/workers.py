@@ -4,7 +4,7 @@
     Workers:
         work horses threads to the real work.
 
-        RetrivalWorker - retrieval workers to fetch data from persistent store.
+        RetrivalWorker - retrieval workers to fetch record batches from persistent store.
         FilterWorker - resposible for filteration of records.
         AggregatorWorker - aggregate the result.
 
@@ -15,47 +15,132 @@
         RetrievalPool - pool to spawn RetrivalWorker workers.
         FilterPool - pool to spawn FilterWorker workers.
         AggregatorPool - pool to spawn AggregatorWorker workers.
+
+    Tuner:
+        Tuner - adjusts the running pools (--concurrency auto).
+
+    Process Pool:
+        ProcessPool - map/reduce over processes, each process runs all
+                      the stages for a shard of data stores.
 """
 
 import collections
+import itertools
+import multiprocessing
 import Queue
+import sys
 import threading
 import time
 
 import config
 from _impl.core.compute import aggregators
-from _impl.utils import log, utils
+from _impl.utils import instrumentation, log
 
 
-# TODO: why are these floating in air? should be in the class.
-data_queue = Queue.Queue()
-filter_queue = Queue.Queue()
-result_queue = Queue.Queue()
+# put by the last producer of a channel, marks the end of the data stream.
+END_OF_STREAM = object()
 
 
-def get_items(queue, prefetch_count=config.Concurrency.prefetch_count):
-    """ Get items from the queue based on prefetch count.
+class Channel(object):
+    """ Bounded queue connecting two stages of the pipeline.
 
-        Args:
-            queue (Queue): queue from which items will be fetched.
+        Every producer closes the channel once it's done, the last
+        one to close puts END_OF_STREAM, which is passed along between
+        the consumers, so all of them know the stream has ended
+        without waiting on a timeout.
+    """
 
-        Kwargs:
-            pretch_count (int): number of items to be fetched at once.
+    def __init__(self, producers, maxsize=config.Concurrency.queue_size,
+                 prefetch_count=config.Concurrency.prefetch_count):
+        """ Initialise the channel.
 
-        Retuens:
-            tuple(list, bool): pair of items fetched and is queue empty.
-    """
-    records = []
-    queue_empty = False
-    for _ in range(prefetch_count):
-        try:
-            item = queue.get(timeout=config.Concurrency.timeout)
-            queue.task_done()
-            records.append(item)
-        except Queue.Empty:
-            queue_empty = True
-            break
-    return records, queue_empty
+            Args:
+                producers (int): number of workers putting items on the channel.
+
+            Kwargs:
+                maxsize (int): maximum items held, producers block beyond it.
+                prefetch_count (int): items a consumer gets at once,
+                                      adjusted by the Tuner.
+        """
+        self.queue = Queue.Queue(maxsize)
+        self.producers = producers
+        self.prefetch_count = prefetch_count
+        self.lock = threading.Lock()
+        # most items held at once, tracked only while profiling
+        self.high_water = 0
+
+        if not producers:
+            self.queue.put(END_OF_STREAM)
+
+    def put(self, item):
+        """ Put an item, blocks while the channel is full.
+
+            Args:
+                item (object): item to be consumed in the next stage.
+        """
+        self.queue.put(item)
+        if instrumentation.enabled:
+            self.high_water = max(self.high_water, self.queue.qsize())
+
+    def add_producer(self):
+        """ Register one more producer, e.g. a worker added to a running pool.
+
+            Returns:
+                bool: False if the stream has already ended.
+        """
+        with self.lock:
+            if not self.producers:
+                return False
+            self.producers += 1
+        return True
+
+    def close(self):
+        """ Close the channel for a producer.
+        """
+        with self.lock:
+            self.producers -= 1
+            last = not self.producers
+        if last:
+            self.queue.put(END_OF_STREAM)
+
+    def drain(self):
+        """ Discard the items up to the end of the stream, e.g. once the
+            consumer has failed, so the producers don't block on a full channel.
+        """
+        ended = False
+        while not ended:
+            _, ended = self.get()
+
+    def get(self, prefetch_count=None):
+        """ Get items from the channel based on prefetch count.
+
+            Kwargs:
+                pretch_count (int): number of items to be fetched at once,
+                                    None for the channel's prefetch count.
+
+            Returns:
+                tuple(list, bool): pair of items fetched and has the stream ended.
+        """
+        prefetch_count = prefetch_count or self.prefetch_count
+        items = []
+        for index in range(prefetch_count):
+            try:
+                # only wait for the first item, whatever else is
+                # available gets prefetched, a batch is large enough
+                # to not hold it back waiting for more.
+                if index:
+                    item = self.queue.get_nowait()
+                else:
+                    item = self.queue.get()
+            except Queue.Empty:
+                break
+
+            if item is END_OF_STREAM:
+                # leave it for the other consumers
+                self.queue.put(END_OF_STREAM)
+                return items, True
+            items.append(item)
+        return items, False
 
 
 class WorkerPool(object):
@@ -75,63 +160,200 @@ class WorkerPool(object):
             self.__class__.__name__, len(self.threads)
         )
 
+    @property
+    def stats(self):
+        """ Stats of the workers, see instrumentation.
+        """
+        return [thread.stats for thread in self.threads]
+
+    @property
+    def records_in(self):
+        """ Records taken in by the workers so far.
+        """
+        return sum(thread.records_in for thread in self.threads)
+
+    def log_summary(self):
+        """ Log the totals of the workers, once they are done.
+        """
+        log.log.info(
+            '%s done -> Batches(%d) Records(%d)', self,
+            sum(thread.batches_in for thread in self.threads), self.records_in
+        )
+
     def join(self):
         """ Join all the workers.
+
+            Raises:
+                Exception: the first failure of a worker, the
+                           results of the pool are incomplete.
         """
         for thread in self.threads:
             thread.join()
+        self.log_summary()
+        for thread in self.threads:
+            if thread.error is not None:
+                type_, value, traceback = thread.error
+                raise type_, value, traceback
 
 
 class RetrivalWorker(threading.Thread):
     """ Worker to retrieve data from persistent store.
     """
-    def __init__(self, index, engines, output):
+    def __init__(self, index, work, output, filters=(), projection=None,
+                 batch_size=config.Concurrency.batch_size):
         """
             Args:
-                engines (list): list of orm engines to rerieve the data.
-                output (Queue): to put the data in post fetching.
+                work (Queue): orm engines to rerieve the data from, shared
+                              by the workers, each pulls the next one once
+                              it's done with the previous.
+                output (Channel): to put the data in post fetching.
 
+            Kwargs:
+                filters (list): filters pushed down to the engines.
+                projection (set): columns to be decoded, None decodes all.
+                batch_size (int): records per batch, a batch is handed
+                                  to the next stage in a single put.
         """
         super(RetrivalWorker, self).__init__()
         self.name = '{}_{}'.format(self.__class__.__name__, index)
-        self.engines = engines
+        self.work = work
         self.output = output
+        self.filters = filters
+        self.projection = projection
+        self.batch_size = batch_size
+        self.stats = instrumentation.create(self.name)
+        # read by the Tuner
+        self.records_out = 0
+        self.batches_out = 0
+        # sys.exc_info() of a failure, raised by the pool's join
+        self.error = None
         self.start()
 
     def run(self):
         """ Function to do the real work.
         """
-        for engine in self.engines:
-            records = engine.get_all_records()
+        stats = self.stats
+        try:
             while True:
                 try:
-                    self.output.put(next(records))
-                except StopIteration:
+                    engine = self.work.get_nowait()
+                except Queue.Empty:
                     break
 
+                batches = engine.get_record_batches(
+                    self.batch_size, self.filters, self.projection
+                )
+                stats.count('bytes_read', engine.size)
+                parse_time = 0.
+                while True:
+                    start = time.time()
+                    batch = next(batches, None)
+                    parse_time += time.time() - start
+                    if batch is None:
+                        break
+
+                    self.batches_out += 1
+                    self.records_out += batch.count
+                    stats.count('batches_out')
+                    stats.count('rows_out', batch.count)
+                    with stats.timer('blocked_put'):
+                        self.output.put(batch)
+                stats.file_time(engine.store_path, parse_time)
+        except Exception:
+            self.error = sys.exc_info()
+            log.log.exception('%s failed', self.name)
+        finally:
+            stats.finish()
+            self.output.close()
+
 
 class RetrievalPool(WorkerPool):
     """ Pool for Retieval workers.
+
+        The data stores are served in order (largest first, see
+        utils.schedule) from a queue shared by the workers, an
+        idle worker pulls the next one.
     """
 
-    def __init__(self, engines, num_threads=config.Concurrency.retriever_threads):
+    def __init__(self, engines, filters=(), projection=None,
+                 num_threads=config.Concurrency.retriever_threads,
+                 batch_size=config.Concurrency.batch_size,
+                 queue_size=config.Concurrency.queue_size,
+                 prefetch_count=config.Concurrency.prefetch_count):
         """ Initialise RetrievalPool workers.
 
             Args:
-                engines (list): list of orm engines to rerieve the data.
+                engines (list): list of orm engines to rerieve the data,
+                                in the order they are served, see utils.schedule.
 
             Kwargs:
+                filters (list): filters pushed down to the engines,
+                                see Filter.pushdown.
+                projection (set): columns to be decoded, None decodes all.
                 num_threads (int): number of workers.
+                batch_size (int): records handed between the stages at once.
+                queue_size (int): maximum batches buffered in the output.
+                prefetch_count (int): batches the next stage gets at once.
         """
         super(RetrievalPool, self).__init__(num_threads)
 
-        distribution = utils.distribution(len(engines), num_threads)
-        for index, units in enumerate(distribution):
-            items = [engines[index] for index in units]
-            worker = RetrivalWorker(index, items, data_queue)
+        self.filters = filters
+        self.projection = projection
+        self.batch_size = batch_size
+        self.work = Queue.Queue()
+        for engine in engines:
+            self.work.put(engine)
+
+        # no more workers than units of work
+        num_threads = min(num_threads, len(engines))
+        self.output = Channel(num_threads, queue_size, prefetch_count)
+        for index in range(num_threads):
+            worker = RetrivalWorker(
+                index, self.work, self.output, filters, projection, batch_size
+            )
             self.threads.append(worker)
 
-        log.log.info(str(self))
+        log.log.info('%s', self)
+
+    @property
+    def records_out(self):
+        """ Records handed on by the workers so far.
+        """
+        return sum(thread.records_out for thread in self.threads)
+
+    def log_summary(self):
+        """ Log the totals of the workers, once they are done.
+        """
+        log.log.info(
+            '%s done -> Batches(%d) Records(%d)', self,
+            sum(thread.batches_out for thread in self.threads), self.records_out
+        )
+
+    def grow(self):
+        """ Add a worker to the running pool.
+
+            Returns:
+                bool: False if no data store is left to be read.
+        """
+        if self.work.empty() or not self.output.add_producer():
+            return False
+        worker = RetrivalWorker(
+            len(self.threads), self.work, self.output, self.filters,
+            self.projection, self.batch_size
+        )
+        self.threads.append(worker)
+        return True
+
+    def resize_batches(self, batch_size):
+        """ Change the batch size, from the next data store on.
+
+            Args:
+                batch_size (int): records per batch.
+        """
+        self.batch_size = batch_size
+        for thread in self.threads:
+            thread.batch_size = batch_size
+
 
 class FilterWorker(threading.Thread):
     """ Worker to filter the records.
@@ -140,56 +362,109 @@ class FilterWorker(threading.Thread):
         """
             Args:
                 filters (list): type of filters to be applied on records.
-                input_ (Queue): queue from the records will be fetched.
-                output (Queue): queue on which filtered records will be kept.
+                input_ (Channel): channel from the records will be fetched.
+                output (Channel): channel on which filtered records will be kept.
         """
         super(FilterWorker, self).__init__()
         self.name = '{}_{}'.format(self.__class__.__name__, index)
         self.filters = filters
         self.input = input_
         self.output = output
+        self.stats = instrumentation.create(self.name)
+        # read by the Tuner
+        self.records_in = 0
+        # for the pool's summary, logging per batch would slow us down
+        self.batches_in = self.records_out = 0
+        # sys.exc_info() of a failure, raised by the pool's join
+        self.error = None
         self.start()
 
     def run(self):
         """ Main worker method.
         """
-        queue_empty = False
-        while not queue_empty:
-            records, queue_empty = get_items(self.input)
-
-            if not records:
-                return
-
-            for filter_ in self.filters:
-                records = list(filter_(records))
-                if records:
-                    log.log.info('{} -> Records({})'.format(filter_, len(records)))
-
-            # put the filtered result onto the Queue
-            # which will be consumed by the consumer
-            for record in records:
-                self.output.put(record)
+        stats = self.stats
+        ended = False
+        try:
+            while not ended:
+                with stats.timer('blocked_get'):
+                    batches, ended = self.input.get()
+
+                for batch in batches:
+                    self.batches_in += 1
+                    self.records_in += batch.count
+                    stats.count('batches_in')
+                    stats.count('rows_in', batch.count)
+                    for filter_ in self.filters:
+                        batch = filter_.filter_batch(batch)
+                        if not batch:
+                            break
+
+                    # put the filtered batch onto the Channel
+                    # which will be consumed by the consumer
+                    if batch:
+                        self.records_out += batch.count
+                        stats.count('batches_out')
+                        stats.count('rows_out', batch.count)
+                        with stats.timer('blocked_put'):
+                            self.output.put(batch)
+        except Exception:
+            self.error = sys.exc_info()
+            log.log.exception('%s failed', self.name)
+            if not ended:
+                self.input.drain()
+        finally:
+            stats.finish()
+            self.output.close()
 
 
 class FilterPool(WorkerPool):
     """ Class to spawn FilterWorker type workers.
     """
-    def __init__(self, filters, num_threads=config.Concurrency.filter_threads):
+    def __init__(self, filters, input_, num_threads=config.Concurrency.filter_threads,
+                 queue_size=config.Concurrency.queue_size,
+                 prefetch_count=config.Concurrency.prefetch_count):
         """ Initialise FilterPool.
 
             Args:
                 filters (list): list of filters.
+                input_ (Channel): channel of retrieved records.
 
             Kwargs:
                 num_threads (int): number of workers.
+                queue_size (int): maximum batches buffered in the output.
+                prefetch_count (int): batches the next stage gets at once.
         """
         super(FilterPool, self).__init__(num_threads)
 
+        self.filters = filters
+        self.input = input_
+        self.output = Channel(num_threads, queue_size, prefetch_count)
         for index in range(num_threads):
-            worker = FilterWorker(index, filters, data_queue, filter_queue)
+            worker = FilterWorker(index, filters, input_, self.output)
             self.threads.append(worker)
 
-        log.log.info(str(self))
+        log.log.info('%s', self)
+
+    def log_summary(self):
+        """ Log the totals of the workers, once they are done.
+        """
+        log.log.info(
+            '%s done %s -> Batches(%d) Records(%d) Selected(%d)', self, self.filters,
+            sum(thread.batches_in for thread in self.threads), self.records_in,
+            sum(thread.records_out for thread in self.threads)
+        )
+
+    def grow(self):
+        """ Add a worker to the running pool.
+
+            Returns:
+                bool: False if the stage has already ended.
+        """
+        if not self.output.add_producer():
+            return False
+        worker = FilterWorker(len(self.threads), self.filters, self.input, self.output)
+        self.threads.append(worker)
+        return True
 
 
 class AggregatorWorker(threading.Thread):
@@ -197,8 +472,8 @@ class AggregatorWorker(threading.Thread):
         """
             Args:
                 aggregator_objs (list): list of aggregator types.
-                input_ (Queue): queue from the records will be fetched.
-                output (Queue): queue on which filtered records will be kept.
+                input_ (Channel): channel from the records will be fetched.
+                output (Queue): queue on which first stage result will be kept.
         """
         super(AggregatorWorker, self).__init__()
 
@@ -207,42 +482,65 @@ class AggregatorWorker(threading.Thread):
         self.aggregator_objs = aggregator_objs
         self.input = input_
         self.output = output
+        self.stats = instrumentation.create(self.name)
+        # read by the Tuner
+        self.records_in = 0
+        # for the pool's summary, logging per batch would slow us down
+        self.batches_in = 0
+        # sys.exc_info() of a failure, raised by the pool's join
+        self.error = None
         self.start()
 
     def run(self):
         """ Main worker method.
         """
+        # first stage results are kept per data store, so
+        # they can be cached and reused per data store.
         initial_result = {}
-        queue_empty = False
-
-        while not queue_empty:
-            records, queue_empty = get_items(self.input)
-            if not records:
-                break
-
-            # get the fist stage result for all aggregators
-            for aggregator in self.aggregator_objs:
-                records_result = initial_result.get(aggregator)
-                records_result = aggregator.record_aggregation(records, records_result)
-                initial_result[aggregator] = records_result
-                log.log.info('Initial Result for {} -> Records({})'.format(aggregator, initial_result[aggregator]))
+        kernel = aggregators.FusedAggregation(self.aggregator_objs)
+        stats = self.stats
+        ended = False
 
+        try:
+            while not ended:
+                with stats.timer('blocked_get'):
+                    batches, ended = self.input.get()
+
+                # get the fist stage result for all aggregators in one pass
+                for batch in batches:
+                    self.batches_in += 1
+                    self.records_in += batch.count
+                    stats.count('batches_in')
+                    stats.count('rows_in', batch.count)
+                    source_result = initial_result.get(batch.source, [None] * len(self.aggregator_objs))
+                    source_result = kernel.batch_aggregation(batch, source_result)
+                    initial_result[batch.source] = source_result
+        except Exception:
+            self.error = sys.exc_info()
+            log.log.exception('%s failed', self.name)
+            if not ended:
+                self.input.drain()
+
+        initial_result = dict(
+            (source, dict(itertools.izip(self.aggregator_objs, results)))
+            for source, results in initial_result.iteritems()
+        )
+        stats.finish()
         # store the result in Queue
         self.output.put(initial_result)
-        log.log.debug('Queue({}) | Initial Dict -> {}'.format(
-                    self.output.qsize(), initial_result)
-        )
+        log.log.debug('Initial Dict -> %s', initial_result)
 
 
 class AggregatorPool(WorkerPool):
     """ Class resposible for spawning AggregatorWorker type workers.
     """
 
-    def __init__(self, aggregator_objs, num_threads=config.Concurrency.aggregator_threads):
+    def __init__(self, aggregator_objs, input_, num_threads=config.Concurrency.aggregator_threads):
         """ Initialise AggregatorPool.
 
             Args:
                 aggregator_objs (list): list of aggregator types.
+                input_ (Channel): channel of filtered records.
 
             Kwargs:
                 num_threads (int): number of workers.
@@ -250,16 +548,38 @@ class AggregatorPool(WorkerPool):
         super(AggregatorPool, self).__init__(num_threads)
 
         self.aggregator_objs = aggregator_objs
-        self.results = []
+        # {data store: {aggregator: [first stage result from workers]}}
+        self.partials = {}
 
-        self.input = filter_queue
-        self.output = result_queue
+        self.input = input_
+        # one small result per worker, no need to bound it
+        self.output = Queue.Queue()
 
         for index in range(num_threads):
             worker = AggregatorWorker(index, aggregator_objs, self.input, self.output)
             self.threads.append(worker)
 
-        log.log.info(str(self))
+        log.log.info('%s', self)
+
+    def log_summary(self):
+        """ Log the totals of the workers, once they are done.
+        """
+        log.log.info(
+            '%s done %s -> Batches(%d) Records(%d)', self, self.aggregator_objs,
+            sum(thread.batches_in for thread in self.threads), self.records_in
+        )
+
+    def grow(self):
+        """ Add a worker to the running pool, the pool
+            must not be grown once it's being joined.
+
+            Returns:
+                bool: always True, a worker added after the end
+                      of the stream hands in an empty result.
+        """
+        worker = AggregatorWorker(len(self.threads), self.aggregator_objs, self.input, self.output)
+        self.threads.append(worker)
+        return True
 
     def join(self):
         """ Join the threads.
@@ -268,28 +588,349 @@ class AggregatorPool(WorkerPool):
         self.finalise()
 
     def finalise(self):
-        """ Finalise the result by aggregating the results from all the workers.
+        """ Gather the first stage results of all the workers per data store,
+            the final results are aggregated by the caller (see final_results).
         """
-        # Deque items and store in a dict, in such a way
-        # such that, {aggregator: [result from workers]}
-
-        initial_results = collections.defaultdict(list)
         while not self.output.empty():
             worker_result = self.output.get()
             self.output.task_done()
-            for aggregator, result in worker_result.iteritems():
-                initial_results[aggregator].append(result)
-
-        log.log.debug('initial_results -> {}'.format(initial_results))
-
-        # To preserve the ordering of final result
-        # loop through the affregators
-        # and get the final result
-        for aggregator in self.aggregator_objs:
-            for a, r in initial_results.iteritems():
-                if a is aggregator:
-                    result = aggregator.result_aggregation(r)
-                    break
+            for source, results in worker_result.iteritems():
+                source_partials = self.partials.setdefault(source, collections.defaultdict(list))
+                for aggregator, result in results.iteritems():
+                    source_partials[aggregator].append(result)
+
+
+class Tuner(threading.Thread):
+    """ Adjusts the running thread pools every interval (--concurrency auto).
+
+        For the filter and aggregator stages, while a stage's input
+        stays backed up the consumers get more batches at once and
+        a worker is added, as long as the stage's throughput grew with
+        the previous one (with the GIL it often doesn't). When the
+        input runs dry the consumers get fewer batches at once, which
+        spreads them over the workers.
+        While the retrieval output stays empty, a retriever is added
+        in the same way, it pulls from the shared queue of data stores.
+        While it stays backed up, the retrievers read larger batches
+        from their next data store on, so the later stages pay the
+        per batch overheads less often.
+
+        Every adjustment is logged.
+    """
+
+    def __init__(self, plan, r_pool, f_pool, a_pool, interval=config.Concurrency.tune_interval):
+        """ Initialise and start the tuner.
+
+            Args:
+                plan (Plan): plan the pools were started with, kept up to date.
+                r_pool (RetrievalPool): pool of the retrieval stage.
+                f_pool (FilterPool): pool of the filter stage.
+                a_pool (AggregatorPool): pool of the aggregator stage.
+
+            Kwargs:
+                interval (float): seconds between the adjustments.
+        """
+        super(Tuner, self).__init__()
+        self.name = self.__class__.__name__
+        self.daemon = True
+        self.plan = plan
+        self.r_pool = r_pool
+        self.f_pool = f_pool
+        self.a_pool = a_pool
+        self.interval = interval
+        self.stopped = threading.Event()
+        # per pool: records at the last tick, consecutive ticks under
+        # pressure, throughput when the last worker was added, saturated
+        self.state = dict(
+            (pool, {'records': 0, 'pressure': 0, 'grown_at': None, 'saturated': False})
+            for pool in (r_pool, f_pool, a_pool)
+        )
+        self.retrieval_backed_up = 0
+        self.start()
+
+    def run(self):
+        """ Adjust every interval until stopped.
+        """
+        while not self.stopped.wait(self.interval):
+            self.tune()
+
+    def stop(self):
+        """ Stop adjusting and log the plan as tuned.
+        """
+        self.stopped.set()
+        self.join()
+        log.log.info('%s final %s', self.name, self.plan)
+
+    def tune(self):
+        """ Adjust the pools once.
+        """
+        # later stages, sized by their input
+        for pool in (self.f_pool, self.a_pool):
+            channel = pool.input
+            depth = channel.queue.qsize()
+            throughput = self.throughput(pool, pool.records_in)
+            if not depth:
+                channel.prefetch_count = max(1, channel.prefetch_count // 2)
+                self.under_pressure(pool, False)
+            elif depth * 4 >= channel.queue.maxsize * 3:
+                channel.prefetch_count = min(
+                    channel.prefetch_count * 2, config.Concurrency.max_prefetch_count
+                )
+                if self.under_pressure(pool, True):
+                    self.grow(pool, throughput, 'input {}/{}, prefetch {}'.format(
+                        depth, channel.queue.maxsize, channel.prefetch_count
+                    ))
+            else:
+                self.under_pressure(pool, False)
+
+        # retrieval, sized by it's output
+        output = self.r_pool.output
+        depth = output.queue.qsize()
+        throughput = self.throughput(self.r_pool, self.r_pool.records_out)
+        if self.under_pressure(self.r_pool, not depth):
+            self.grow(self.r_pool, throughput, 'output empty')
+
+        if depth * 4 >= output.queue.maxsize * 3:
+            self.retrieval_backed_up += 1
+        else:
+            self.retrieval_backed_up = 0
+        if self.retrieval_backed_up >= 2 and self.r_pool.batch_size < config.Concurrency.max_batch_size:
+            self.r_pool.resize_batches(self.r_pool.batch_size * 2)
+            self.retrieval_backed_up = 0
+            log.log.info('%s %s batch size %d', self.name, self.r_pool, self.r_pool.batch_size)
+
+        self.plan.retriever_threads = len(self.r_pool.threads)
+        self.plan.filter_threads = len(self.f_pool.threads)
+        self.plan.aggregator_threads = len(self.a_pool.threads)
+        self.plan.batch_size = self.r_pool.batch_size
+        self.plan.prefetch_count = self.f_pool.input.prefetch_count
+
+    def throughput(self, pool, records):
+        """ Records per second of a pool since the last tick.
+
+            Args:
+                pool (WorkerPool): the pool.
+                records (int): records handled by the pool so far.
+
+            Returns:
+                float: records per second.
+        """
+        state = self.state[pool]
+        throughput = (records - state['records']) / self.interval
+        state['records'] = records
+        return throughput
+
+    def under_pressure(self, pool, pressure):
+        """ Track the consecutive ticks a pool is under pressure.
+
+            Args:
+                pool (WorkerPool): the pool.
+                pressure (bool): is it under pressure at this tick.
+
+            Returns:
+                bool: True once it has been for two ticks.
+        """
+        state = self.state[pool]
+        state['pressure'] = state['pressure'] + 1 if pressure else 0
+        return state['pressure'] >= 2
+
+    def grow(self, pool, throughput, reason):
+        """ Add a worker to a pool, unless the previous one didn't help.
+
+            Args:
+                pool (WorkerPool): the pool.
+                throughput (float): records per second of the pool.
+                reason (str): why, for the log.
+        """
+        state = self.state[pool]
+        if state['saturated'] or len(pool.threads) >= config.Concurrency.max_threads:
+            return
+        if state['grown_at'] is not None and throughput <= state['grown_at'] * 1.05:
+            # the last worker didn't help, don't add more
+            state['saturated'] = True
+            log.log.info('%s %s saturated at %.0f records/s', self.name, pool, throughput)
+            return
+        if pool.grow():
+            state['grown_at'] = throughput
+            state['pressure'] = 0
+            log.log.info('%s grew %s at %.0f records/s, %s', self.name, pool, throughput, reason)
+
+
+def final_results(aggregator_objs, partials):
+    """ Second stage aggregation of the first stage results.
+
+        Args:
+            aggregator_objs (list): list of aggregator types.
+            partials (list): dicts of {aggregator: [first stage result]},
+                             e.g. one per data store.
+
+        Returns:
+            list: final result per aggregator, in the order of aggregator_objs.
+    """
+    # store the results in a dict, in such a way
+    # such that, {aggregator: [first stage results]}
+    initial_results = collections.defaultdict(list)
+    for partial in partials:
+        for aggregator, results in partial.iteritems():
+            initial_results[aggregator].extend(results)
 
-            log.log.info('Final Result for {} -> Result({})'.format(aggregator, result))
-            self.results.append(result)
+    log.log.debug('initial_results -> %s', initial_results)
+
+    # To preserve the ordering of final result
+    # loop through the affregators
+    # and get the final result
+    results = []
+    for aggregator in aggregator_objs:
+        result = None
+        if aggregator in initial_results:
+            result = aggregator.result_aggregation(initial_results[aggregator])
+
+        log.log.info('Final Result for %s -> Result(%s)', aggregator, result)
+        results.append(result)
+    return results
+
+
+def aggregate_batches(batches, filters, kernel, results, stats=instrumentation.NULL_STATS):
+    """ Filter the batches and perform the first stage aggregation
+        in the calling thread.
+
+        Args:
+            batches (Iterable): retrieved record batches.
+            filters (list): filters applied on the batches.
+            kernel (FusedAggregation): aggregators to be run.
+            results (list): first stage result so far per aggregator.
+
+        Kwargs:
+            stats (WorkerStats): counts the batches and records taken in
+                                 and the ones aggregated (out).
+
+        Returns:
+            list: first stage result per aggregator.
+    """
+    for batch in batches:
+        stats.count('batches_in')
+        stats.count('rows_in', batch.count)
+        for filter_ in filters:
+            batch = filter_.filter_batch(batch)
+            if not batch:
+                break
+        if not batch:
+            continue
+
+        stats.count('batches_out')
+        stats.count('rows_out', batch.count)
+        results = kernel.batch_aggregation(batch, results)
+    return results
+
+
+def map_data_stores(args):
+    """ Map step of the process executor, runs in a worker process.
+
+        Retrieves, filters and performs the first stage aggregation
+        for a shard of data stores.
+
+        Args:
+            args (tuple): engines, pushed down filters, remaining filters,
+                          projection and aggregator objects.
+
+        Returns:
+            tuple(dict, WorkerStats): data store to it's first stage result
+                                      per aggregator (None if no record reached
+                                      the aggregator) and stats of the process.
+    """
+    engines, pushdown_filters, filters, projection, aggregator_objs = args
+    source_results = {}
+    kernel = aggregators.FusedAggregation(aggregator_objs)
+    stats = instrumentation.create(multiprocessing.current_process().name)
+
+    for engine in engines:
+        start = time.time()
+        # byte ranges of a data store add up to it's result
+        results = source_results.get(engine.store_path, [None] * len(aggregator_objs))
+        batches = engine.get_record_batches(
+            filters=pushdown_filters, projection=projection
+        )
+        source_results[engine.store_path] = aggregate_batches(batches, filters, kernel, results, stats)
+        stats.count('bytes_read', engine.size)
+        stats.file_time(engine.store_path, time.time() - start)
+    stats.finish()
+
+    log.log.info('%s -> Results(%s)', multiprocessing.current_process().name, source_results)
+    return source_results, stats
+
+
+class ProcessPool(object):
+    """ Map/reduce over worker processes.
+
+        Unlike the thread pools, every process runs all three stages
+        for the data stores it's given and only the first stage results
+        are sent back to be aggregated in here. The data stores (or their
+        byte ranges, see Engine.split) are handed out one at a time,
+        largest first, to whichever process is idle.
+    """
+
+    def __init__(self, engines, pushdown_filters, filters, projection,
+                 aggregator_objs, num_processes=config.Concurrency.processes):
+        """ Initialise ProcessPool and start mapping the data stores.
+
+            Args:
+                engines (list): list of orm engines to rerieve the data,
+                                in the order they are served, see utils.schedule.
+                pushdown_filters (list): filters pushed down to the engines.
+                filters (list): filters applied on the retrieved batches.
+                projection (set): columns to be decoded, None decodes all.
+                aggregator_objs (list): list of aggregator types.
+
+            Kwargs:
+                num_processes (int): number of worker processes.
+        """
+        self.aggregator_objs = aggregator_objs
+        # {data store: {aggregator: [first stage result]}}
+        self.partials = {}
+        # per process, see instrumentation
+        self.stats = []
+
+        tasks = [
+            ([engine], pushdown_filters, filters, projection, aggregator_objs)
+            for engine in engines
+        ]
+        num_processes = max(1, min(num_processes, len(tasks)))
+        self.pool = multiprocessing.Pool(num_processes)
+        # one task at a time per process, so idle ones pick up the rest
+        self.task_results = self.pool.imap_unordered(map_data_stores, tasks, chunksize=1)
+
+        log.log.info('%s(%d)', self.__class__.__name__, num_processes)
+
+    def join(self):
+        """ Wait for the processes and reduce their results.
+
+            Raises:
+                Exception: the failure of a process, the rest are stopped.
+        """
+        try:
+            task_results = list(self.task_results)
+        except Exception:
+            self.pool.terminate()
+            raise
+        self.pool.close()
+        self.pool.join()
+
+        # processes worked on copies of the aggregators, so
+        # key the results back by the aggregators in here.
+        process_stats = collections.OrderedDict()
+        for source_results, stats in task_results:
+            if stats.name in process_stats:
+                process_stats[stats.name].merge(stats)
+            else:
+                process_stats[stats.name] = stats
+            for source, results in source_results.iteritems():
+                # a data store split in byte ranges has a result per range
+                source_partials = self.partials.setdefault(source, {})
+                for aggregator, result in itertools.izip(self.aggregator_objs, results):
+                    if result is not None:
+                        source_partials.setdefault(aggregator, []).append(result)
+        self.stats.extend(process_stats.values())
+        log.log.info(
+            '%s done -> Tasks(%d) DataStores(%d)', self.__class__.__name__,
+            len(task_results), len(self.partials)
+        )
@@ -1,66 +1,277 @@
 """ Module for caching.
 """
 import ast
+import contextlib
+import math
 import os
+import sqlite3
+import time
 
 import config
 from _impl.utils import log, utils
 
 
+class Cache(object):
+    """ Key value store for the results backed by sqlite.
 
+        Lookups go through the primary key index, the least recently
+        used items are evicted once the store grows beyond the configured
+        entries or bytes. sqlite takes care of the locking between
+        concurrent invocations of the app.
+    """
 
+    def __init__(self, cache_file=config.Cache.persistence_path,
+                 max_entries=config.Cache.max_entries, max_bytes=config.Cache.max_bytes):
+        """ Open (create if required) the cache store.
 
-class Cache(object):
-
-    def __init__(self, cache_file=config.Cache.persistence_path):
+            Kwargs:
+                cache_file (str): path of the sqlite database.
+                max_entries (int): maximum number of items kept.
+                max_bytes (int): maximum size of the values kept.
+        """
         self.cache_file = cache_file
-        self.cache_items = {}
-
-        # create an empty file
-        if not os.path.isfile(self.cache_file):
-            open(self.cache_file, 'w').close()
-
-    def set(self, cmd, value):
-        key = get_hash(cmd)
-        item = {key: value}
-        self.cache_items.update(item)
-        with open(self.cache_file, 'a') as cache_file:
-            cache_file.write('{}\n'.format(item))
-        log.log.info('CACHE SET for ITEM({})'.format(item))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # transactions are handled explicitly, see transaction()
+        self.connection = sqlite3.connect(
+            cache_file, timeout=config.Cache.lock_timeout, isolation_level=None
+        )
+        # readers don't block on a writer
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # rows replaced by INSERT OR REPLACE fire the delete trigger
+        self.connection.execute('PRAGMA recursive_triggers=ON')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS items ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'size INTEGER NOT NULL, accessed REAL NOT NULL)'
+        )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS items_accessed ON items (accessed)'
+        )
+        # number and size of the items, kept up to date by the triggers,
+        # so eviction doesn't go through all the items on every write.
+        with self.transaction() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS totals ('
+                'id INTEGER PRIMARY KEY CHECK (id = 0), '
+                'entries INTEGER NOT NULL, bytes INTEGER NOT NULL)'
+            )
+            connection.execute(
+                'INSERT OR IGNORE INTO totals (id, entries, bytes) '
+                'SELECT 0, COUNT(*), TOTAL(size) FROM items'
+            )
+            connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS items_insert AFTER INSERT ON items BEGIN '
+                'UPDATE totals SET entries = entries + 1, bytes = bytes + new.size; END'
+            )
+            connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS items_delete AFTER DELETE ON items BEGIN '
+                'UPDATE totals SET entries = entries - 1, bytes = bytes - old.size; END'
+            )
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """ Write transaction, takes the write lock upfront so
+            concurrent writers wait (up to lock_timeout) instead of failing.
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.connection
+        except Exception:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def set_items(self, items):
+        """ Store the items and evict the least recently used ones if required.
+
+            Args:
+                items (dict): key to value, values should be python literals.
+
+            Returns:
+                bool: True once stored.
+        """
+        now = time.time()
+        rows = []
+        for key, value in items.iteritems():
+            value = repr(value)
+            rows.append((key, value, len(value), now))
+
+        with self.transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO items (key, value, size, accessed) '
+                'VALUES (?, ?, ?, ?)', rows
+            )
+            self.evict()
+        log.log.info('CACHE SET for ITEMS(%d)', len(rows))
         return True
 
-    def get(self, cmd):
-        key = get_hash(cmd)
-        value = self.cache_items.get(key)
-        if not value:
-            with open(self.cache_file, 'r') as cache_file:
-                for line in cache_file.readlines():
-                    if not key in line:
-                        continue
-                    item = ast.literal_eval(line)
-                    log.log.info('CACHE GET from FILE with KEY({}): VALUE({})'.format(key, item[key]))
-                    return item[key]
-        log.log.info('CACHE GET for KEY({}): VALUE({})'.format(key, value))
+    def get_items(self, keys):
+        """ Get the cached items, marking them as recently used.
+
+            Args:
+                keys (list): keys to look up.
+
+            Returns:
+                dict: key to value for the keys found.
+        """
+        items = {}
+        # stay below sqlite's limit of variables per statement
+        for index in xrange(0, len(keys), 500):
+            chunk = keys[index: index + 500]
+            rows = self.connection.execute(
+                'SELECT key, value FROM items WHERE key IN ({})'.format(
+                    ', '.join('?' * len(chunk))
+                ), chunk
+            )
+            items.update((key, ast.literal_eval(value)) for key, value in rows)
+
+        if items:
+            now = time.time()
+            with self.transaction() as connection:
+                connection.executemany(
+                    'UPDATE items SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in items]
+                )
+        return items
+
+    def evict(self):
+        """ Delete the least recently used items beyond max entries or bytes.
+            Should be called inside a transaction.
+        """
+        evicted = 0
+        while True:
+            entries, total = self.connection.execute(
+                'SELECT entries, bytes FROM totals'
+            ).fetchone()
+            if entries <= self.max_entries and total <= self.max_bytes:
+                break
+
+            count = entries - self.max_entries
+            if total > self.max_bytes:
+                # as many as the overflow of bytes takes on average
+                average = float(total) / entries
+                count = max(count, int(math.ceil((total - self.max_bytes) / average)))
+            self.connection.execute(
+                'DELETE FROM items WHERE key IN '
+                '(SELECT key FROM items ORDER BY accessed LIMIT ?)', (max(count, 1),)
+            )
+            evicted += max(count, 1)
+
+        if evicted:
+            log.log.info('CACHE EVICTED ITEMS(%d)', evicted)
+
+
+class PartialCache(object):
+    """ First stage aggregation results cached per data store.
+
+        A data store is keyed by it's path, size and modified time, so
+        a repeat query only scans the new or changed data stores and
+        the results of the rest are taken from the cache.
+    """
+
+    def __init__(self, cache_obj, filter_args):
+        """ Initialise the cache.
+
+            Args:
+                cache_obj (Cache): cache to store the results in.
+                filter_args (list): filters of the query.
+        """
+        self.cache = cache_obj
+        self.filter_args = filter_args
+        # keys are computed before the data stores are scanned, a data
+        # store changing during the scan gets a miss next time.
+        self.keys = {}
+
+    def key(self, engine, aggregator):
+        """ Get the cache key for the first stage results.
+
+            Args:
+                engine (Engine): engine of the data store.
+                aggregator (Aggregator): aggregator of the query.
+
+            Returns:
+                str: hash value in hex.
+        """
+        if (engine.store_path, aggregator) not in self.keys:
+            self.keys[(engine.store_path, aggregator)] = get_partial_hash(
+                engine.store_path, self.filter_args, aggregator
+            )
+        return self.keys[(engine.store_path, aggregator)]
+
+    def lookup(self, engines, aggregator_objs):
+        """ Get the cached first stage results.
+
+            Args:
+                engines (list): engines of the data stores.
+                aggregator_objs (list): aggregators of the query.
+
+            Returns:
+                tuple(dict, list): {data store: {aggregator: [first stage result]}}
+                                   for the cached ones and the engines to be scanned.
+        """
+        items = self.cache.get_items([
+            self.key(engine, aggregator)
+            for engine in engines for aggregator in aggregator_objs
+        ])
+
+        partials = {}
+        stale = []
+        for engine in engines:
+            source_partials = {}
+            hit = True
+            for aggregator in aggregator_objs:
+                results = items.get(self.key(engine, aggregator))
+                if results is None:
+                    hit = False
+                    break
+                if results:
+                    source_partials[aggregator] = results
+
+            if hit:
+                partials[engine.store_path] = source_partials
+            else:
+                stale.append(engine)
+
+        log.log.info('PARTIAL CACHE HIT(%d) MISS(%d)', len(partials), len(stale))
+        return partials, stale
+
+    def update(self, engines, aggregator_objs, partials):
+        """ Cache the first stage results of scanned data stores.
+
+            Args:
+                engines (list): engines of the scanned data stores.
+                aggregator_objs (list): aggregators of the query.
+                partials (dict): {data store: {aggregator: [first stage result]}}
+        """
+        items = {}
+        for engine in engines:
+            source_partials = partials.get(engine.store_path, {})
+            for aggregator in aggregator_objs:
+                items[self.key(engine, aggregator)] = source_partials.get(aggregator, [])
+        self.cache.set_items(items)
 
 
-def get_hash(cmd):
-    """ Get hash key from args
+def get_partial_hash(store_path, filter_args, aggregator):
+    """ Get hash key for the first stage results of a data store.
 
         Args:
-            cmd (Command): command object from which we ca retieve required args.
+            store_path (str): path of the data store.
+            filter_args (list): filters of the query.
+            aggregator (Aggregator): aggregator of the query.
 
         Returns
             str: hash value in hex.
     """
-    # only use the filename for hash as it's location can change
-    # which will change the absolute path in turn the hash value
-    # but the content of the file remains the same.
-    filename = os.path.basename(cmd.logs_dir)
-    filter_args = sorted(cmd.filter_args)
-    aggregator_args = sorted(cmd.aggregator_args)
-
-    seq = [filename, filter_args, aggregator_args]
-    log.log.info('CACHE SEQ({})'.format(seq))
-    hash_ = utils.hash_(seq)
-
-    return hash_
+    # size and modified time changes as soon as
+    # rows are appended to the data store.
+    stat = os.stat(store_path)
+    seq = [
+        'path:{}'.format(store_path),
+        'size:{}'.format(stat.st_size),
+        'mtime:{!r}'.format(stat.st_mtime),
+        'filters:{}'.format(sorted(filter_args)),
+        'aggregator:{}'.format(aggregator),
+    ]
+    return utils.hash_(seq)
@@ -2,6 +2,7 @@
 """
 
 import argparse
+import datetime
 import os
 
 import config
@@ -28,6 +29,9 @@ class Command(object):
         self.logs_dir = None
         self.filter_args = None
         self.aggregator_args = None
+        self.execution_args = None
+        self.date_args = None
+        self.group_args = None
         self.namespace = None
 
         self.add_arguments()
@@ -59,7 +63,7 @@ class Command(object):
 
     def _add_aggregator_args(self):
         """ Add the aggregator arguments to the  parser.
-            avgtime, avgcpu, avgram, maxram, maxcpu and summary
+            avgtime, avgcpu, avgram, maxram, maxcpu, pcttime, pctcpu, pctram and summary
         """
         category = 'aggregators'
         description = config.Arguments.args[category]['description']
@@ -72,11 +76,28 @@ class Command(object):
         for arg in config.Arguments.args[category]['arguments']:
             exclusive_group.add_argument('--' + arg[0], '-' + arg[1], help=arg[2], action=arg[3])
 
+    def _add_option_args(self, category):
+        """ Add the arguments of a category, which take their
+            argparse options from the config, to the parser.
+
+            Args:
+                category (str): category of the arguments e.g. execution.
+        """
+        description = config.Arguments.args[category]['description']
+        group = self.parser.add_argument_group(
+            category.title(), description
+        )
+        for arg in config.Arguments.args[category]['arguments']:
+            group.add_argument('--' + arg[0], '-' + arg[1], help=arg[2], **arg[3])
+
     def add_arguments(self):
         """ Add all the arguments to the parser.
         """
         self._add_filter_args()
         self._add_aggregator_args()
+        self._add_option_args('dates')
+        self._add_option_args('grouping')
+        self._add_option_args('execution')
         self._add_dir_arg()
 
     def _get_filter_args(self):
@@ -97,6 +118,29 @@ class Command(object):
             for arg in config.Arguments.args[category]['arguments']
         ]
 
+    def _get_execution_args(self):
+        """ Get the execution args from user input.
+        """
+        category = 'execution'
+        self.execution_args = dict(
+            (arg[0], getattr(self.namespace, arg[0]))
+            for arg in config.Arguments.args[category]['arguments']
+        )
+
+    def _get_date_args(self):
+        """ Get the date args from user input.
+        """
+        category = 'dates'
+        self.date_args = dict(
+            (arg[0], getattr(self.namespace, arg[0]))
+            for arg in config.Arguments.args[category]['arguments']
+        )
+
+    def _get_group_args(self):
+        """ Get the group by columns from user input.
+        """
+        self.group_args = self.namespace.group_by
+
     def _get_dir_arg(self):
         """ Get the filter args from user input.
         """
@@ -107,6 +151,48 @@ class Command(object):
         """
         self.logs_dir = os.path.abspath(self.logs_dir)
 
+    def _fix_date_args(self):
+        """ Convert the date args to a (start, end) date range,
+            either of them is None if not bounded.
+        """
+        start, end, last = [self.date_args[arg] for arg in ('from', 'to', 'last')]
+        if last is not None:
+            if start or end:
+                self.parser.error('--last can not be combined with --from/--to')
+            if last < 1:
+                self.parser.error('--last expects a positive number of days')
+            end = datetime.date.today()
+            start = end - datetime.timedelta(days=last - 1)
+        else:
+            try:
+                start, end = [
+                    datetime.datetime.strptime(date, config.DataStore.date_format).date()
+                    if date else None
+                    for date in (start, end)
+                ]
+            except ValueError as error:
+                self.parser.error(str(error))
+            if start and end and start > end:
+                self.parser.error('--from {} is after --to {}'.format(start, end))
+
+        self.date_args = (start, end)
+
+    def _fix_group_args(self):
+        """ Split the group by columns, only string columns can be grouped by.
+        """
+        if not self.group_args:
+            self.group_args = ()
+            return
+
+        columns = [name for name, type_ in config.Columns.all_ if type_ is str]
+        group_args = tuple(column.strip() for column in self.group_args.split(','))
+        for column in group_args:
+            if column not in columns:
+                self.parser.error('can not group by {!r}, choose from {}'.format(
+                    column, ', '.join(columns)
+                ))
+        self.group_args = group_args
+
     def _fix_filter_args(self):
         """ Fix filter ags if necessary.
         """
@@ -142,8 +228,7 @@ class Command(object):
                 break
 
         if has_summary:
-            for ind, (arg, val) in enumerate(self.aggregator_args):
-                self.aggregator_args[ind] = arg
+            self.aggregator_args = list(config.Arguments.summary)
         else:
             for ind, (arg, val) in enumerate(self.aggregator_args):
                 if val:
@@ -165,8 +250,13 @@ class Command(object):
         self._get_dir_arg()
         self._get_filter_args()
         self._get_aggregator_args()
+        self._get_date_args()
+        self._get_group_args()
+        self._get_execution_args()
 
         self._fix_dir_arg()
+        self._fix_date_args()
+        self._fix_group_args()
         # order is imp. for below statements
         self._fix_aggregator_args()
         self._fix_filter_args()
@@ -177,12 +267,47 @@ class Command(object):
             Args:
                 output (object) : final result received.
         """
+        if self.group_args:
+            self.display_groups(output)
+            return
+
+        output = self.convert_output(output)
+        # TODO: in future take diffent output streams: stdout, file, to db etc.
+        output = [str(o) for o in output]
+        print config.Output.display_delimiter.join(output)
+
+    def display_groups(self, output):
+        """ Display the grouped output, a line per group
+            with the group values followed by it's results.
+
+            Args:
+                output (list) : group to result dict per aggregator.
+        """
+        output = [o or {} for o in output]
+        groups = sorted(set(key for o in output for key in o))
+        lines = []
+        for key in groups:
+            results = self.convert_output([o.get(key) for o in output])
+            lines.append(config.Output.group_delimiter.join(
+                list(key) + [str(result) for result in results]
+            ))
+        print config.Output.display_delimiter.join(lines)
+
+    def convert_output(self, output):
+        """ Convert the results to their display units.
+
+            Args:
+                output (list) : result per aggregator.
+
+            Returns:
+                list: converted results.
+        """
+        output = list(output)
         for arg, convert_func in config.Output.conversion.iteritems():
             try:
                 index = self.aggregator_args.index(arg)
-                output[index] = convert_func(output[index])
+                if output[index] is not None:
+                    output[index] = convert_func(output[index])
             except ValueError:
                 pass
-        # TODO: in future take diffent output streams: stdout, file, to db etc.
-        output = [str(o) for o in output]
-        print config.Output.display_delimiter.join(output)
+        return output
@@ -0,0 +1,73 @@
+""" Thin client of the query daemon (see _impl.core.daemon).
+"""
+import ast
+import os
+import socket
+
+import config
+from _impl.utils import log
+
+
+def create_request(cmd):
+    """ Create the daemon request of the parsed cli args.
+
+        Args:
+            cmd (Command): parsed cli args.
+
+        Returns:
+            dict: the query.
+    """
+    return {
+        'logs_dir': os.path.abspath(cmd.logs_dir),
+        'filter_args': list(cmd.filter_args),
+        'aggregator_args': list(cmd.aggregator_args),
+        'group_args': tuple(cmd.group_args),
+        'date_args': tuple(date.isoformat() if date else None for date in cmd.date_args),
+    }
+
+
+def query(request, socket_path=config.Daemon.socket_path, timeout=config.Daemon.timeout):
+    """ Get the results of a query from the daemon.
+
+        Args:
+            request (dict): the query, see create_request.
+
+        Kwargs:
+            socket_path (str): path of the daemon's unix socket.
+            timeout (float): seconds to wait on the daemon.
+
+        Returns:
+            list or None: final result per aggregator, None if
+                          the daemon isn't running or can't answer.
+    """
+    if not os.path.exists(socket_path):
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(socket_path)
+        connection.sendall(repr(request))
+        connection.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = connection.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    except socket.error as error:
+        log.log.warning('Daemon on %s not reachable: %s', socket_path, error)
+        return None
+    finally:
+        connection.close()
+
+    try:
+        response = ast.literal_eval(''.join(chunks))
+        if 'error' in response:
+            log.log.warning('Daemon could not answer: %s', response['error'])
+            return None
+        return response['results']
+    except (SyntaxError, ValueError, TypeError, KeyError) as error:
+        # e.g. a truncated reply of a daemon which died mid query
+        log.log.warning('Invalid response of the daemon on %s: %r', socket_path, error)
+        return None
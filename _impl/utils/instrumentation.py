@@ -0,0 +1,246 @@
+""" Counters and timers of the pipeline stages (--profile).
+
+    Every worker owns a WorkerStats, so there is no locking on the
+    hot path, the pool sums them up for the report. When profiling is
+    disabled workers get NULL_STATS, which does nothing, the cost is a
+    few no-op calls per batch.
+
+    Counters:
+        batches_in, rows_in - batches and selected records taken in.
+        batches_out, rows_out - batches and selected records handed on.
+        bytes_read - size of the data stores read.
+    Timers:
+        blocked_get - waiting on the input channel.
+        blocked_put - waiting on a full output channel.
+        busy - lifetime of the worker less the time blocked.
+"""
+import collections
+import contextlib
+import cProfile
+import pstats
+import resource
+import sys
+import threading
+import time
+
+
+# set by main for --profile
+enabled = False
+
+# one cProfile.Profile per thread, see profile_threads
+profilers = []
+
+
+class WorkerStats(object):
+    """ Counters and timers of a worker.
+    """
+
+    def __init__(self, name):
+        """ Initialise the stats.
+
+            Args:
+                name (str): name of the worker.
+        """
+        self.name = name
+        self.counters = collections.defaultdict(int)
+        self.timers = collections.defaultdict(float)
+        # data store to seconds spent parsing it
+        self.files = {}
+        self.start = time.time()
+        self.end = None
+
+    def __str__(self):
+        return '{}({})'.format(self.__class__.__name__, self.name)
+
+    def count(self, name, value=1):
+        """ Add to a counter.
+
+            Args:
+                name (str): name of the counter.
+
+            Kwargs:
+                value (int): amount to add.
+        """
+        self.counters[name] += value
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """ Add the time spent in the block to a timer.
+
+            Args:
+                name (str): name of the timer.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.time() - start
+
+    def file_time(self, store_path, seconds):
+        """ Record the time spent on a data store.
+
+            Args:
+                store_path (str): path of the data store.
+                seconds (float): time taken.
+        """
+        self.files[store_path] = self.files.get(store_path, 0.) + seconds
+
+    def finish(self):
+        """ Mark the end of the worker, busy time is derived from it.
+        """
+        self.end = time.time()
+        blocked = self.timers['blocked_get'] + self.timers['blocked_put']
+        self.timers['busy'] = self.end - self.start - blocked
+
+    def merge(self, other):
+        """ Add the stats of another run of the same worker,
+            e.g. a task of a worker process.
+
+            Args:
+                other (WorkerStats): stats to be added.
+        """
+        for name, value in other.counters.iteritems():
+            self.counters[name] += value
+        for name, value in other.timers.iteritems():
+            self.timers[name] += value
+        for store_path, seconds in other.files.iteritems():
+            self.file_time(store_path, seconds)
+        self.start = min(self.start, other.start)
+        self.end = max(self.end, other.end)
+
+
+class NullStats(object):
+    """ Stand-in for WorkerStats when profiling is disabled.
+    """
+    name = None
+    files = {}
+
+    def count(self, name, value=1):
+        pass
+
+    def timer(self, name):
+        return _null_timer
+
+    def file_time(self, store_path, seconds):
+        pass
+
+    def finish(self):
+        pass
+
+    def merge(self, other):
+        pass
+
+
+class _NullTimer(object):
+    """ No-op context manager.
+    """
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        return False
+
+
+_null_timer = _NullTimer()
+NULL_STATS = NullStats()
+
+
+def create(name):
+    """ Create the stats of a worker.
+
+        Args:
+            name (str): name of the worker.
+
+        Returns:
+            WorkerStats or NullStats: NullStats if profiling is disabled.
+    """
+    return WorkerStats(name) if enabled else NULL_STATS
+
+
+def profile_threads():
+    """ Run cProfile in the current thread and every thread started from now on.
+    """
+    def bootstrap(frame, event, arg):
+        # first profile event of a new thread, hand over to cProfile
+        start_profiler()
+
+    def start_profiler():
+        profiler = cProfile.Profile()
+        profilers.append(profiler)
+        profiler.enable()
+
+    threading.setprofile(bootstrap)
+    start_profiler()
+
+
+def dump_profile(path, stream=sys.stderr, limit=20):
+    """ Stop profiling, merge the profiles of all the threads
+        and dump them.
+
+        Args:
+            path (str): file to dump the stats in, see pstats.
+
+        Kwargs:
+            stream (file): where to print the top functions.
+            limit (int): number of top functions printed.
+    """
+    threading.setprofile(None)
+    stats = None
+    # main thread's profiler is the first, disable it last
+    for profiler in reversed(profilers):
+        profiler.disable()
+        if stats is None:
+            stats = pstats.Stats(profiler, stream=stream)
+        else:
+            stats.add(profiler)
+    del profilers[:]
+
+    if stats is None:
+        return
+    stats.dump_stats(path)
+    stats.sort_stats('cumulative').print_stats(limit)
+
+
+def report(stages, stream=sys.stderr):
+    """ Print the per stage report.
+
+        Args:
+            stages (list): (stage name, list of WorkerStats, queue high water
+                           mark of the stage's output or None) triples, empty
+                           if nothing was scanned.
+
+        Kwargs:
+            stream (file): where to print the report.
+    """
+    counters = ['batches_in', 'rows_in', 'batches_out', 'rows_out', 'bytes_read']
+    timers = ['busy', 'blocked_get', 'blocked_put']
+    header = ['stage', 'workers'] + counters + [t + ' s' for t in timers] + ['high water']
+    row_format = '{:<12}{:>8}' + '{:>15}' * (len(header) - 2)
+    if stages:
+        print >> stream, row_format.format(*header)
+    else:
+        # e.g. all the data stores were served from the partial cache
+        print >> stream, 'no data store scanned'
+
+    files = {}
+    for name, worker_stats, high_water in stages:
+        totals = [sum(s.counters[c] for s in worker_stats) for c in counters]
+        # time is summed over the workers
+        totals += ['{:.3f}'.format(sum(s.timers[t] for s in worker_stats)) for t in timers]
+        totals.append('-' if high_water is None else high_water)
+        print >> stream, row_format.format(name, len(worker_stats), *totals)
+        for stats in worker_stats:
+            for store_path, seconds in stats.files.iteritems():
+                files[store_path] = files.get(store_path, 0.) + seconds
+
+    if files:
+        print >> stream, '\n{:<80}{:>12}'.format('data store', 'parse s')
+        for store_path in sorted(files):
+            print >> stream, '{:<80}{:>12.3f}'.format(store_path, files[store_path])
+
+    # kilobytes on linux
+    print >> stream, '\npeak rss KB {}'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if children:
+        # of the largest one, e.g. a worker process of the process executor
+        print >> stream, 'peak rss of a child process KB {}'.format(children)
@@ -1,12 +1,124 @@
+""" Logging of the app.
+
+    Records are put on a queue by QueueHandler and written to the log
+    file by a background thread (QueueListener), so workers never wait
+    on the file. Messages take lazy %-style arguments, e.g.
+        log.log.info('Results %s', results)
+    they are formatted by the background thread, not by the caller,
+    arguments should not be modified once logged.
+
+    When the queue is full, debug and info records are dropped and
+    counted on the next record queued, warnings and errors wait for room.
+"""
+import atexit
 import logging
+import os
+import Queue
+import threading
 
 import config
 
 
+class QueueHandler(logging.Handler):
+    """ Hands the records over to a QueueListener.
+
+        In a forked process (e.g. the process executor) the listener
+        thread doesn't exist, records are handled right away there.
+    """
+
+    def __init__(self, queue, target):
+        """ Initialise the handler.
+
+            Args:
+                queue (Queue): queue of the listener.
+                target (Handler): handler of the listener, used directly
+                                  in forked processes.
+        """
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.target = target
+        self.pid = os.getpid()
+        self.dropped = 0
+
+    def emit(self, record):
+        """ Queue the record, if the queue is full a debug or info
+            record is dropped, others wait for room in the queue.
+
+            Args:
+                record (LogRecord): record to be written.
+        """
+        if os.getpid() != self.pid:
+            if self.pid is not None:
+                # forked while the listener might have held the lock
+                self.target.createLock()
+                self.pid = None
+            self.target.handle(record)
+            return
+
+        if record.exc_info:
+            # don't hold on to the frames, format the traceback now
+            record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        if self.dropped:
+            record.msg = '{} [{} earlier records dropped]'.format(record.msg, self.dropped)
+        try:
+            self.queue.put(record, record.levelno >= logging.WARNING)
+            self.dropped = 0
+        except Queue.Full:
+            self.dropped += 1
+
+
+class QueueListener(object):
+    """ Background thread writing the queued records.
+    """
+
+    def __init__(self, queue, handler):
+        """ Initialise the listener.
+
+            Args:
+                queue (Queue): queue of records.
+                handler (Handler): handler writing the records.
+        """
+        self.queue = queue
+        self.handler = handler
+        self.thread = None
+
+    def start(self):
+        """ Start the background thread.
+        """
+        self.thread = threading.Thread(target=self.run, name=self.__class__.__name__)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        """ Write the records until stopped.
+        """
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            self.handler.handle(record)
+
+    def stop(self):
+        """ Write the records queued so far and stop the thread.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.handler.flush()
+
+
 def initialise_logger():
     log = logging.getLogger(config.app)
     log.setLevel(config.Logging.level)
 
+    # run artifacts (_logs) aren't checked in, create the directory
+    directory = os.path.dirname(config.Logging.persistence_path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
     # create a file handler
     handler = logging.FileHandler(config.Logging.persistence_path)
     handler.setLevel(config.Logging.level)
@@ -15,8 +127,15 @@ def initialise_logger():
     formatter = logging.Formatter(config.Logging.message_format)
     handler.setFormatter(formatter)
 
+    # write from a background thread
+    queue = Queue.Queue(config.Logging.queue_size)
+    listener = QueueListener(queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
     # add the handlers to the log
-    log.addHandler(handler)
+    log.addHandler(QueueHandler(queue, handler))
     return log
 
+
 log = initialise_logger()
@@ -1,34 +1,41 @@
 """ Module containing general uitility functions.
 """
 
+import datetime
 import glob
 import hashlib
+import operator
 import os
+import re
 
 import config
 from _impl.core.orm import engine
 from _impl.core.orm import models
 
 
-def distribution(item_size, workers):
-    """ Round robin distribution of items over workers.
+def schedule(engines, range_size=config.Concurrency.range_size):
+    """ Units of work of the data stores, largest first.
+
+        Large csv data stores are split into byte ranges (see Engine.split),
+        so they are parsed by several workers at once. Workers pulling from
+        a shared queue in this order finish at about the same time, a large
+        unit isn't left to be read last.
 
         Args:
-            item_size (int): size of the items.
-            workers (int): number of workers.
+            engines (list): orm engines of the data stores.
+
+        Kwargs:
+            range_size (int): bytes per range of a split data store.
 
         Returns:
-            Filter: iterator which can generate items indicies for workers.
+            list: orm engines of the data stores or of their byte ranges.
     """
-    distribution = [[] for _ in range(workers)]
-    index = 0
-    while index < item_size:
-        distribution[index % workers].append(index)
-        index += 1
-    return filter(bool, distribution)
+    units = [unit for engine in engines for unit in engine.split(range_size)]
+    return sorted(units, key=operator.attrgetter('size'), reverse=True)
 
 
-def collect_data_stores(logs_dir, filename_pattern=config.DataStore.filename_pattern):
+def collect_data_stores(logs_dir, filename_pattern=config.DataStore.filename_pattern,
+                        date_range=(None, None)):
     """ Collect all data files from persistent store.
 
         Args:
@@ -36,16 +43,57 @@ def collect_data_stores(logs_dir, filename_pattern=config.DataStore.filename_pat
 
         Kwargs:
             filename_pattern (str): pattern to fetch the file names.
+            date_range (tuple): (start, end) dates (inclusive) of the data
+                                stores to be collected, None if unbounded.
+                                Data stores are pruned by the date in their
+                                name, without being opened.
 
         Yield:
                 Engine: Orm engine per data store.
     """
     logs_dir = os.path.abspath(logs_dir)
     for render_stats in glob.iglob(os.path.join(logs_dir, filename_pattern)):
+        if not in_date_range(render_stats, date_range):
+            continue
         log_file = os.path.join(logs_dir, render_stats)
         yield engine.Engine(log_file, models.RenderStats)
 
 
+def in_date_range(store_path, date_range):
+    """ Check the render date of a data store against a date range.
+
+        Args:
+            store_path (str): path of the data store.
+            date_range (tuple): (start, end) dates (inclusive), None if unbounded.
+
+        Returns:
+            bool: True if the data store falls in the range.
+    """
+    start, end = date_range
+    if not (start or end):
+        return True
+    date = data_store_date(store_path)
+    return not any([date is None, start and date < start, end and date > end])
+
+
+def data_store_date(store_path):
+    """ Get the render date from data store's name.
+
+        Args:
+            store_path (str): path of the data store.
+
+        Returns:
+            date or None: render date, None if the name has no valid date.
+    """
+    match = re.search(config.DataStore.date_regex, os.path.basename(store_path))
+    if not match:
+        return None
+    try:
+        return datetime.datetime.strptime(match.group(1), config.DataStore.date_format).date()
+    except ValueError:
+        return None
+
+
 def hash_(seq):
     """ Generate hash from the given sequence.
 
@@ -0,0 +1,6 @@
+""" Benchmarks for the app.
+
+    Run them from the parent app folder as modules, e.g.
+
+        python -m benchmarks.records
+"""
@@ -0,0 +1,156 @@
+""" Synthetic render logs for the benchmarks.
+
+    Usage:
+        python -m benchmarks.data logs_dir [--files N] [--rows M]
+            [--apps maya=3,nuke=1] [--renderers arnold=2,vray=1] [--failure-rate 0.1]
+"""
+import argparse
+import bisect
+import datetime
+import os
+import random
+
+
+apps = {'maya': 1, 'houdini': 1, 'nuke': 1, 'katana': 1}
+renderers = {'arnold': 1, 'renderman': 1, 'redshift': 1, 'vray': 1}
+
+
+def weighted_choice(weights):
+    """ Create a function picking a key of weights in proportion to it's weight.
+
+        Args:
+            weights (dict): value to it's (relative) weight.
+
+        Returns:
+            callable: takes a random.Random and returns a value.
+    """
+    values = sorted(weights)
+    cumulative = []
+    total = 0
+    for value in values:
+        total += weights[value]
+        cumulative.append(total)
+
+    def choice(rand):
+        return values[bisect.bisect_right(cumulative, rand.random() * total)]
+    return choice
+
+
+def synthetic_rows(count, seed=0, start_uid=0, apps=apps, renderers=renderers, failure_rate=0.):
+    """ Generate raw csv like rows.
+
+        Args:
+            count (int): number of rows.
+
+        Kwargs:
+            seed (int): random seed.
+            start_uid (int): uid of the first row.
+            apps (dict): app to it's relative weight.
+            renderers (dict): renderer to it's relative weight.
+            failure_rate (float): fraction of failed renders, they
+                                  have no elapsed time, ram and cpu.
+
+        Returns:
+            list: list of rows (list of str).
+    """
+    rand = random.Random(seed)
+    app = weighted_choice(apps)
+    renderer = weighted_choice(renderers)
+    rows = []
+    for uid in xrange(start_uid, start_uid + count):
+        if failure_rate and rand.random() < failure_rate:
+            rows.append([
+                str(uid), app(rand), renderer(rand), str(rand.randint(1, 300)),
+                'false', '0', '', '',
+            ])
+            continue
+        rows.append([
+            str(uid),
+            app(rand),
+            renderer(rand),
+            str(rand.randint(1, 300)),
+            'true',
+            str(rand.randint(100, 100000)),
+            '{:.2f}'.format(rand.uniform(100, 9000)),
+            '{:.2f}'.format(rand.uniform(1, 100)),
+        ])
+    return rows
+
+
+def data_store_name(date):
+    """ File name of the data store for a date.
+
+        Args:
+            date (date): render date.
+
+        Returns:
+            str: name matching config.DataStore.filename_pattern.
+    """
+    return 'renders_{}.csv'.format(date.strftime('%Y-%m-%d'))
+
+
+def write_data_stores(logs_dir, files, rows, start=datetime.date(2017, 1, 1), **kwargs):
+    """ Write daily data stores with synthetic rows.
+
+        Args:
+            logs_dir (str): directory to write the data stores in.
+            files (int): number of daily files.
+            rows (int): number of rows per file.
+
+        Kwargs:
+            start (date): date of the first file.
+            kwargs: passed on to synthetic_rows e.g. failure_rate.
+
+        Returns:
+            list: paths of the written data stores.
+    """
+    if not os.path.isdir(logs_dir):
+        os.makedirs(logs_dir)
+
+    paths = []
+    for day in xrange(files):
+        path = os.path.join(logs_dir, data_store_name(start + datetime.timedelta(day)))
+        with open(path, 'w') as store:
+            for row in synthetic_rows(rows, seed=day, start_uid=day * rows, **kwargs):
+                store.write(','.join(row) + '\n')
+        paths.append(path)
+    return paths
+
+
+def parse_weights(text):
+    """ Parse weights given as name=weight pairs, e.g. maya=3,nuke=1.
+
+        Args:
+            text (str): comma separated pairs.
+
+        Returns:
+            dict: name to it's weight.
+    """
+    weights = {}
+    for pair in text.split(','):
+        name, _, weight = pair.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic render logs.')
+    parser.add_argument('logs_dir', help='Directory to write the data stores in.')
+    parser.add_argument('--files', type=int, default=10, help='Number of daily data stores.')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows per data store.')
+    parser.add_argument('--start', default='2017-01-01', help='Date of the first data store.')
+    parser.add_argument('--apps', type=parse_weights, default=apps, help='e.g. maya=3,nuke=1')
+    parser.add_argument('--renderers', type=parse_weights, default=renderers, help='e.g. arnold=2,vray=1')
+    parser.add_argument('--failure-rate', type=float, default=0., help='Fraction of failed renders.')
+    args = parser.parse_args()
+
+    paths = write_data_stores(
+        args.logs_dir, args.files, args.rows,
+        datetime.datetime.strptime(args.start, '%Y-%m-%d').date(),
+        apps=args.apps, renderers=args.renderers, failure_rate=args.failure_rate,
+    )
+    print '\n'.join(paths)
+
+
+if __name__ == '__main__':
+    main()
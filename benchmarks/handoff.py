@@ -0,0 +1,125 @@
+""" Benchmark for the hand-off between pipeline stages.
+
+    Writes a synthetic logs directory (a million rows by default) and
+    for every chunk (batch) size reports
+        channel  - time to pass the rows through two channels in chunks,
+                   with the same thread layout as the pools, no parsing.
+                   This is the queue overhead alone.
+        pipeline - end to end time of a success count query through
+                   the thread pools.
+
+    Usage:
+        python -m benchmarks.handoff [rows] [files]
+"""
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import config
+from _impl.core import workers
+from _impl.core.compute import aggregators, filters
+from _impl.utils import utils
+from benchmarks import data
+
+
+chunk_sizes = [16, 64, 256, 1024, 4096, 16384]
+
+
+def channel_handoff(rows, chunk_size):
+    """ Pass rows through retrieval -> filter -> aggregation channels.
+
+        Args:
+            rows (int): number of rows.
+            chunk_size (int): rows per queue operation.
+
+        Returns:
+            float: seconds taken.
+    """
+    row = ['0'] * len(config.Columns.all_)
+    chunk = [row] * chunk_size
+    retrievers = config.Concurrency.retriever_threads
+    first = workers.Channel(retrievers)
+    second = workers.Channel(config.Concurrency.filter_threads)
+
+    def produce(count):
+        for _ in xrange(count):
+            first.put(chunk)
+        first.close()
+
+    def forward():
+        ended = False
+        while not ended:
+            items, ended = first.get()
+            for item in items:
+                second.put(item)
+        second.close()
+
+    def consume():
+        ended = False
+        while not ended:
+            _, ended = second.get()
+
+    chunks = rows // chunk_size
+    threads = [
+        threading.Thread(target=produce, args=(chunks // retrievers,))
+        for _ in range(retrievers)
+    ]
+    threads += [threading.Thread(target=forward) for _ in range(config.Concurrency.filter_threads)]
+    threads += [threading.Thread(target=consume) for _ in range(config.Concurrency.aggregator_threads)]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - start
+
+
+def pipeline(logs_dir, chunk_size):
+    """ Success count query through the thread pools.
+
+        Args:
+            logs_dir (str): directory of the data stores.
+            chunk_size (int): records per batch.
+
+        Returns:
+            float: seconds taken.
+    """
+    engines = list(utils.collect_data_stores(logs_dir))
+    success = filters.FilterFactory.create(config.Columns.success, 'true')
+    count = aggregators.AggregateFactory.create(config.Columns.success)
+
+    start = time.time()
+    r_pool = workers.RetrievalPool(utils.schedule(engines), [success], set(), batch_size=chunk_size)
+    f_pool = workers.FilterPool([], r_pool.output)
+    a_pool = workers.AggregatorPool([count], f_pool.output)
+    r_pool.join()
+    f_pool.join()
+    a_pool.join()
+    return time.time() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    logs_dir = tempfile.mkdtemp()
+    try:
+        data.write_data_stores(logs_dir, files, rows // files)
+
+        print '{:>10}{:>14}{:>14}{:>14}'.format('chunk', 'queue ops', 'channel s', 'pipeline s')
+        for chunk_size in chunk_sizes:
+            queue_ops = 2 * (rows // chunk_size)
+            print '{:>10}{:>14}{:>14.3f}{:>14.3f}'.format(
+                chunk_size, queue_ops,
+                channel_handoff(rows, chunk_size),
+                pipeline(logs_dir, chunk_size),
+            )
+    finally:
+        shutil.rmtree(logs_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+""" Benchmark of the csv parsers of the engine.
+
+    Compares the csv parser (csv.reader per line) with the fast path
+    parser (a chunk of lines split at once, see _impl.core.orm.parser)
+    on the same data stores, checking both return the same batches.
+
+    Logs:
+        synthetic - every render succeeded, apps and renderers even.
+        real-shaped - skewed apps and renderers and 10% failed renders,
+                      which have empty elapsed time, ram and cpu.
+        logs_dir - the data stores of a real logs directory, if given.
+
+    Queries:
+        all columns - every column decoded, e.g. building a sidecar.
+        elapsed time - a single column, e.g. --avgtime.
+        maya ram - a pushed down filter and a column, e.g. --avgram --app maya.
+
+    Usage:
+        python -m benchmarks.parsing [rows] [logs_dir]
+"""
+import shutil
+import sys
+import tempfile
+import time
+
+import config
+from _impl.core.compute import filters
+from _impl.utils import utils
+from benchmarks import data
+
+
+queries = [
+    ('all columns', [], None),
+    ('elapsed time', [], set([config.Columns.elapsed_time])),
+    ('maya ram', [(config.Columns.app, 'maya')], set([config.Columns.maxram])),
+]
+
+
+def parse(engines, filters_objs, projection, parser_):
+    """ Parse the data stores.
+
+        Args:
+            engines (list): orm engines of the data stores.
+            filters_objs (list): filters pushed down to the engines.
+            projection (set): columns to be decoded, None decodes all.
+            parser_ (str): fast or csv.
+
+        Returns:
+            tuple(float, int, list): seconds taken, rows read and the batches.
+    """
+    batches = []
+    start = time.time()
+    for engine in engines:
+        with open(engine.store_path, 'r') as file_handler:
+            batches.extend(engine.parse_record_batches(
+                file_handler, filters=filters_objs, projection=projection, parser_=parser_
+            ))
+    seconds = time.time() - start
+    return seconds, sum(batch.count for batch in batches), batches
+
+
+def compare(name, logs_dir):
+    """ Print the rows/sec of both parsers for every query.
+
+        Args:
+            name (str): name of the logs.
+            logs_dir (str): directory of the data stores.
+    """
+    engines = list(utils.collect_data_stores(logs_dir))
+    rows = sum(1 for engine in engines for _ in open(engine.store_path))
+    for query, filter_args, projection in queries:
+        filters_objs = [filters.FilterFactory.create(column, value) for column, value in filter_args]
+        csv_seconds, selected, csv_batches = parse(engines, filters_objs, projection, 'csv')
+        fast_seconds, _, fast_batches = parse(engines, filters_objs, projection, 'fast')
+        same = [batch.columns for batch in csv_batches] == [batch.columns for batch in fast_batches]
+        print '{:<14}{:<14}{:>10}{:>14.0f}{:>14.0f}{:>10.2f}{:>8}'.format(
+            name, query, selected, rows / csv_seconds, rows / fast_seconds,
+            csv_seconds / fast_seconds, 'yes' if same else 'NO',
+        )
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    logs_dirs = [
+        ('synthetic', {}),
+        ('real-shaped', {
+            'apps': {'maya': 6, 'houdini': 2, 'nuke': 1, 'katana': 1},
+            'renderers': {'arnold': 5, 'renderman': 2, 'redshift': 2, 'vray': 1},
+            'failure_rate': 0.1,
+        }),
+    ]
+
+    print '{:<14}{:<14}{:>10}{:>14}{:>14}{:>10}{:>8}'.format(
+        'logs', 'query', 'selected', 'csv rows/s', 'fast rows/s', 'speedup', 'same'
+    )
+    for name, kwargs in logs_dirs:
+        logs_dir = tempfile.mkdtemp()
+        try:
+            data.write_data_stores(logs_dir, 1, rows, **kwargs)
+            compare(name, logs_dir)
+        finally:
+            shutil.rmtree(logs_dir)
+
+    if len(sys.argv) > 2:
+        compare('logs_dir', sys.argv[2])
+
+
+if __name__ == '__main__':
+    main()
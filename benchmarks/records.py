@@ -0,0 +1,132 @@
+""" Micro-benchmark for the record representation.
+
+    Compares the previous per-record Model/Column objects with the
+    compact tuple based RenderStats model (and the columnar RecordBatch)
+    by reporting bytes per record and rows per second.
+
+    Usage:
+        python -m benchmarks.records [rows]
+"""
+import itertools
+import sys
+import time
+
+import config
+from _impl.core.orm import models
+from benchmarks import data
+
+
+class LegacyColumn(object):
+    """ Previous Column implementation, a Column object per record value.
+    """
+    def __init__(self, index, name, type_):
+        self.index = index
+        self.name = name
+        self.type_ = type_
+        self._value = None
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        if all([value, type(value) != self.type_]):
+            value = self.type_(value)
+        self._value = value
+
+
+class LegacyRenderStats(object):
+    """ Previous RenderStats implementation, a list of Column objects per record.
+    """
+    def __init__(self):
+        self._name = None
+        self._columns = []
+        for index, (name, typ) in enumerate(config.Columns.all_):
+            self._columns.append(LegacyColumn(index, name, typ))
+
+    @property
+    def columns(self):
+        return self._columns
+
+    def set_values(self, values):
+        for column, value in itertools.izip(self.columns, values):
+            column.value = value
+
+
+def deep_sizeof(obj, seen=None):
+    """ Get the size of an object including everything it references.
+    """
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.iteritems())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += deep_sizeof(obj.__dict__, seen)
+    return size
+
+
+def legacy_record(row):
+    record = LegacyRenderStats()
+    record.set_values(row)
+    return record
+
+
+def compact_record(row):
+    return models.RenderStats.from_values(row)
+
+
+def record_size(create, rows):
+    """ Average bytes per record, excluding the shared class level objects.
+    """
+    # class level objects (e.g. types, column names) are shared
+    # between the records, mark them seen to not count them.
+    seen = set(id(name) for name, _ in config.Columns.all_)
+    records = [create(row) for row in rows]
+    return sum(deep_sizeof(record, seen) for record in records) / float(len(records))
+
+
+def batch_size(rows):
+    """ Average bytes per record for a columnar batch.
+    """
+    batch = models.RecordBatch.from_rows(rows, config.Columns.all_)
+    return deep_sizeof(batch.columns) / float(len(batch))
+
+
+def rows_per_sec(create, rows):
+    start = time.time()
+    for row in rows:
+        create(row)
+    return len(rows) / (time.time() - start)
+
+
+def batch_rows_per_sec(rows):
+    start = time.time()
+    size = config.Concurrency.batch_size
+    for index in xrange(0, len(rows), size):
+        models.RecordBatch.from_rows(rows[index: index + size], config.Columns.all_)
+    return len(rows) / (time.time() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rows = data.synthetic_rows(count)
+    sample = rows[:1000]
+
+    print '{:<24}{:>16}{:>16}'.format('representation', 'bytes/record', 'rows/sec')
+    for name, size, speed in [
+        ('Model/Column (before)', record_size(legacy_record, sample), rows_per_sec(legacy_record, rows)),
+        ('RenderStats (after)', record_size(compact_record, sample), rows_per_sec(compact_record, rows)),
+        ('RecordBatch', batch_size(sample), batch_rows_per_sec(rows)),
+    ]:
+        print '{:<24}{:>16.1f}{:>16.0f}'.format(name, size, speed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+""" End to end benchmark of the queries.
+
+    Writes a synthetic logs directory and runs main.py for every
+    filter/aggregator combination under every concurrency setting,
+    each run in it's own process with an empty cache, measuring
+        wall_time - seconds from start to exit of the run.
+        rows_per_sec - rows in the logs directory over wall time.
+        peak_rss_kb - maximum resident memory of the run.
+
+    Results are saved as JSON, so runs can be compared over time.
+
+    Usage:
+        python -m benchmarks.suite [--files N] [--rows M] [--failure-rate 0.1]
+            [--sidecars] [--log-level INFO] [--output results.json] [--quick]
+"""
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import config
+from benchmarks import data
+
+
+filter_args = [
+    [],
+    ['--app', 'maya'],
+    ['--renderer', 'arnold'],
+    ['--app', 'maya', '--renderer', 'arnold'],
+    ['--failed'],
+]
+
+aggregator_args = [
+    [],
+    ['--avgtime'],
+    ['--maxram'],
+    ['--pcttime'],
+    ['--summary'],
+    ['--summary', '--group-by', 'app,renderer'],
+]
+
+
+def concurrency_settings():
+    """ Concurrency settings to run every query with.
+
+        Returns:
+            list: dicts of executor and config.Concurrency attributes.
+    """
+    settings = [
+        {'executor': 'thread', 'retriever_threads': threads,
+         'filter_threads': threads, 'aggregator_threads': threads}
+        for threads in (1, 2, 4)
+    ]
+    settings += [
+        {'executor': 'process', 'processes': processes}
+        for processes in sorted(set([1, multiprocessing.cpu_count()]))
+    ]
+    return settings
+
+
+def run(logs_dir, args, settings, sidecars, log_level=None):
+    """ Run a query in a child process.
+
+        Args:
+            logs_dir (str): directory of the data stores.
+            args (list): cli args of the query.
+            settings (dict): concurrency setting, see concurrency_settings.
+            sidecars (bool): read the data stores from sidecars.
+
+        Kwargs:
+            log_level (str): logging level of the run, e.g. CRITICAL
+                             to measure the cost of logging, None
+                             keeps config.Logging.level.
+
+        Returns:
+            dict: wall time and peak rss of the run.
+    """
+    work_dir = tempfile.mkdtemp()
+    child = {
+        'concurrency': dict((k, v) for k, v in settings.iteritems() if k != 'executor'),
+        'cache': os.path.join(work_dir, 'cache.db'),
+        'sidecars': os.path.join(logs_dir, '.sidecars') if sidecars else None,
+        'socket': os.path.join(work_dir, 'daemon.sock'),
+        'log_level': log_level,
+    }
+    command = [
+        sys.executable, '-m', 'benchmarks.suite', '--child', json.dumps(child), '--',
+        logs_dir, '--executor', settings['executor'],
+    ] + args
+
+    try:
+        with open(os.devnull, 'w') as devnull:
+            start = time.time()
+            process = subprocess.Popen(command, stdout=devnull)
+            # rusage of this child only, not of all children
+            _, status, usage = os.wait4(process.pid, 0)
+            wall_time = time.time() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if status:
+        raise RuntimeError('{} exited with {}'.format(command, status))
+    return {'wall_time': wall_time, 'peak_rss_kb': usage.ru_maxrss}
+
+
+def child_main(child, argv):
+    """ Run main.py with the given settings, in the child process.
+
+        Args:
+            child (str): json of the settings.
+            argv (list): cli args of main.py.
+    """
+    child = json.loads(child)
+    # config is read when the modules are imported,
+    # so patch it before importing main.
+    for name, value in child['concurrency'].iteritems():
+        setattr(config.Concurrency, name, value)
+    config.Cache.persistence_path = child['cache']
+    config.Daemon.socket_path = child['socket']
+    if child['log_level']:
+        config.Logging.level = getattr(logging, child['log_level'])
+    config.Sidecar.enabled = bool(child['sidecars'])
+    if child['sidecars']:
+        config.Sidecar.persistence_path = child['sidecars']
+        # synthetic data stores are written just now
+        config.Sidecar.min_age = 0
+
+    import main
+    sys.argv = ['main.py'] + argv
+    main.main()
+
+
+def main():
+    if '--child' in sys.argv:
+        index = sys.argv.index('--child')
+        child_main(sys.argv[index + 1], sys.argv[sys.argv.index('--') + 1:])
+        return
+
+    parser = argparse.ArgumentParser(description='End to end benchmark of the queries.')
+    parser.add_argument('--files', type=int, default=10, help='Number of daily data stores.')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows per data store.')
+    parser.add_argument('--failure-rate', type=float, default=0.1, help='Fraction of failed renders.')
+    parser.add_argument('--sidecars', action='store_true', help='Read the data stores from sidecars.')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'CRITICAL'],
+                        help='Logging level of the runs (default from Logging config).')
+    parser.add_argument('--quick', action='store_true',
+                        help='Only the first two filter and aggregator combinations.')
+    parser.add_argument('--output', help='JSON file of the results '
+                                         '(default ./_logs/benchmarks/suite-<time>.json).')
+    args = parser.parse_args()
+
+    created = datetime.datetime.now()
+    output = args.output or os.path.abspath(
+        './_logs/benchmarks/suite-{}.json'.format(created.strftime('%Y%m%d-%H%M%S'))
+    )
+    queries = [
+        filters + aggregators
+        for filters in (filter_args[:2] if args.quick else filter_args)
+        for aggregators in (aggregator_args[:2] if args.quick else aggregator_args)
+    ]
+
+    logs_dir = tempfile.mkdtemp()
+    try:
+        data.write_data_stores(logs_dir, args.files, args.rows, failure_rate=args.failure_rate)
+        rows = args.files * args.rows
+
+        if args.sidecars:
+            # build the sidecars up front, not in the first measured run
+            run(logs_dir, [], concurrency_settings()[0], args.sidecars)
+
+        runs = []
+        print '{:<50}{:<80}{:>10}{:>14}{:>12}'.format(
+            'query', 'settings', 'wall s', 'rows/sec', 'rss KB'
+        )
+        for settings in concurrency_settings():
+            for query in queries:
+                measured = run(logs_dir, query, settings, args.sidecars, args.log_level)
+                measured.update({
+                    'query': query,
+                    'settings': settings,
+                    'rows_per_sec': rows / measured['wall_time'],
+                })
+                runs.append(measured)
+                print '{:<50}{:<80}{:>10.3f}{:>14.0f}{:>12}'.format(
+                    ' '.join(query) or '(success count)',
+                    ' '.join('{}={}'.format(k, v) for k, v in sorted(settings.iteritems())),
+                    measured['wall_time'], measured['rows_per_sec'], measured['peak_rss_kb'],
+                )
+    finally:
+        shutil.rmtree(logs_dir)
+
+    if not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as output_file:
+        json.dump({
+            'created': created.isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': multiprocessing.cpu_count(),
+            'files': args.files,
+            'rows': rows,
+            'failure_rate': args.failure_rate,
+            'sidecars': args.sidecars,
+            'log_level': args.log_level or logging.getLevelName(config.Logging.level),
+            'runs': runs,
+        }, output_file, indent=2)
+    print 'Saved {}'.format(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 """ Module containing all the config for the app
 """
 
+import multiprocessing
 import os
 
 
@@ -13,6 +14,18 @@ class DataStore(object):
     # "\d{4}" doesn't works with glob therefore multiple [0-9]
     filename_pattern = 'renders_{year}-{month}-{date}.csv'.format(
         year='[0-9]' * 4, month='[0-9]' * 2, date='[0-9]' * 2)
+    # render date part of the file name
+    date_regex = r'renders_(\d{4}-\d{2}-\d{2})\.csv$'
+    date_format = '%Y-%m-%d'
+    # how the csv is read, mmap maps a window of the data store at a time
+    # and splits it's rows in bulk, file reads it through a file object
+    reader = 'file'
+    # how the lines are split into fields, fast splits a chunk of lines
+    # at once (csv only for quoted lines), csv splits every line with csv
+    parser = 'fast'
+    # bytes mapped at once, the window is unmapped once it's rows are
+    # split, so memory doesn't grow with the size of the data store
+    map_window = 256 * 1024
 
 
 class Columns(object):
@@ -42,6 +55,9 @@ class Columns(object):
 class Arguments(object):
     """ Configs for user arguments.
     """
+    # aggregators of --summary, in output order
+    summary = ['avgtime', 'avgcpu', 'avgram', 'maxram', 'maxcpu']
+
     args = {
         'dir': ('logs_dir', 'Directory to get the render logs.', '?', os.getcwd),
         'filters': {
@@ -60,9 +76,55 @@ class Arguments(object):
                 ('avgram', 'ar', 'Find the average ram usage of renders.', 'store_true'),
                 ('maxram', 'mr', 'Find the maximum ram usage of renders.', 'store_true'),
                 ('maxcpu', 'mc', 'Find the maximum cpu usage of renders.', 'store_true'),
+                ('pcttime', 'pt', 'Find the p50, p95 and p99 elapsed time of renders.', 'store_true'),
+                ('pctcpu', 'pc', 'Find the p50, p95 and p99 cpu usage of renders.', 'store_true'),
+                ('pctram', 'pr', 'Find the p50, p95 and p99 ram usage of renders.', 'store_true'),
                 ('summary', 's', 'Output the summary by printing avg_time avg_cpu avg_ram max_cpu.', 'store_true'),
             ]
-        }
+        },
+        'dates': {
+            'description': 'Only consider the renders of given dates, '
+                           'data stores of other dates are not read at all.',
+            'arguments': [
+                ('from', 'fd', 'Renders on or after the date.', {'metavar': 'YYYY-MM-DD'}),
+                ('to', 'td', 'Renders on or before the date.', {'metavar': 'YYYY-MM-DD'}),
+                ('last', 'ld', 'Renders of the last N days, including today.',
+                 {'metavar': 'N', 'type': int}),
+            ]
+        },
+        'grouping': {
+            'description': 'Calculate the stats per group of renders.',
+            'arguments': [
+                ('group-by', 'g', 'Comma separated columns to group by e.g. app,renderer.',
+                 {'metavar': 'COLUMNS'}),
+            ]
+        },
+        'execution': {
+            'description': 'Control how the query is executed.',
+            'arguments': [
+                ('executor', 'e', 'Run the stages in threads or as map/reduce over processes.',
+                 {'choices': ['thread', 'process'], 'default': 'thread'}),
+                ('concurrency', 'cn', 'Size the workers and batches from the Concurrency config (static) '
+                                      'or from the cores, data stores and storage, adjusting them '
+                                      'while running (auto).',
+                 {'choices': ['static', 'auto'], 'default': 'static'}),
+                ('follow', 'fo', 'Keep following the newest data stores and output '
+                                'the updated results every interval.', {'action': 'store_true'}),
+                ('interval', 'in', 'Seconds between the outputs while following '
+                                  '(default from Follow config).', {'type': float, 'metavar': 'SECONDS'}),
+                ('daemon', 'dm', 'Keep the records of logs dir in memory and answer the queries '
+                                 'of other runs, which talk to it over the Daemon config socket.',
+                 {'action': 'store_true'}),
+                ('profile', 'pf', 'Print a report of every stage (rows, bytes, busy and blocked '
+                                  'time, queue high water marks, parse time per data store) on stderr.',
+                 {'action': 'store_true'}),
+                ('cprofile', 'cp', 'Dump cProfile stats of all the threads to the file.',
+                 {'metavar': 'PATH'}),
+                ('sidecars', 'sc', 'Once the results are output, build the missing sidecars of the '
+                                   'large data stores read in byte ranges, so later runs memory map them.',
+                 {'action': 'store_true'}),
+            ]
+        },
     }
 
 
@@ -70,8 +132,11 @@ class Output(object):
     """ Config for output result.
     """
     display_delimiter = '\n'
+    # between the group values and the results of a group
+    group_delimiter = '\t'
     conversion = {
         'avgtime': lambda x: x * .001,  # milliseconds to seconds
+        'pcttime': lambda x: tuple(value * .001 for value in x),
     }
 
 
@@ -82,14 +147,81 @@ class Concurrency(object):
     filter_threads = 2
     aggregator_threads = 2
     prefetch_count = 10
-    timeout = .3
+    # maximum batches buffered between two stages
+    queue_size = 16
+    # number of records read into a single RecordBatch, which is
+    # also the chunk handed between the stages in one queue operation.
+    # see benchmarks.handoff for the effect of different sizes.
+    batch_size = 4096
+    # worker processes for the process executor
+    processes = multiprocessing.cpu_count()
+    # csv data stores larger than this are parsed in byte ranges of
+    # about this size, in parallel, see Engine.split
+    range_size = 64 * 1024 * 1024
+
+    # --concurrency auto, see _impl.core.planner and workers.Tuner
+    # most workers of a stage
+    max_threads = multiprocessing.cpu_count() * 2
+    min_batch_size = 512
+    max_batch_size = 8192
+    max_prefetch_count = 32
+    # average size of a row in bytes, to estimate the records of a data store
+    row_bytes = 45
+    # seconds between the adjustments of the running pools
+    tune_interval = 0.5
 
 
 class Cache(object):
     """ Config for caching
     """
     # relative to parent root not from here
-    persistence_path = os.path.abspath('./_logs/cache.cache')
+    persistence_path = os.path.abspath('./_logs/cache.db')
+    # least recently used items are evicted beyond these
+    max_entries = 100000
+    max_bytes = 64 * 1024 * 1024
+    # seconds to wait for another invocation holding the write lock
+    lock_timeout = 30
+
+
+class Sidecar(object):
+    """ Config for binary columnar sidecars of the data stores.
+    """
+    enabled = True
+    # relative to parent root not from here
+    persistence_path = os.path.abspath('./_logs/sidecars')
+    # data stores modified within these many seconds are still
+    # being written to (e.g. today's renders), they are read as csv.
+    min_age = 60 * 60
+
+
+class Follow(object):
+    """ Config for following the growing data stores (--follow).
+    """
+    # seconds between the outputs
+    interval = 5.0
+
+
+class Daemon(object):
+    """ Config for the query daemon (--daemon).
+    """
+    # relative to parent root not from here
+    socket_path = os.path.abspath('./_logs/daemon.sock')
+    # seconds between the checks for new and appended rows
+    poll_interval = 5.0
+    # seconds a client waits on the daemon
+    timeout = 60.0
+    # memoized first stage results per data store
+    max_partials = 1000
+
+
+class Quantiles(object):
+    """ Config for the quantile sketches of the percentile aggregators.
+    """
+    quantiles = (0.5, 0.95, 0.99)
+    # quantiles are off by at most 1% of their value
+    relative_accuracy = 0.01
+    # 2048 bins of 1% cover values over 17 orders of magnitude
+    max_bins = 2048
 
 
 class Logging(object):
@@ -97,3 +229,5 @@ class Logging(object):
     level = logging.INFO
     message_format = '%(asctime)s - %(name)s - %(levelname)s - %(threadName)s - %(message)s'
     persistence_path = os.path.abspath('./_logs/log.log')
+    # records waiting to be written, beyond it debug and info ones are dropped
+    queue_size = 10000
@@ -3,19 +3,28 @@
 
     Basic steps of working
     > get the user inputs
+    > ask the daemon, if one is running (or become one with --daemon)
     > collect the files from persistent store
-    > retrieve the render records
+    > get the cached results of unchanged files
+    > retrieve the render records of the rest
     > filter the records according to user inputs
     > aggregate the result
+      (either through the thread pools or the process pool)
     > output the result
+    > with --follow, keep reading the rows appended to the newest
+      data stores and output the updated result every interval
 """
 
+import os
+import sys
+import time
+
 import config
 from _impl.core.orm import engine
 from _impl.core.compute import aggregators, filters
 from _impl.core.orm import models
-from _impl.core import workers
-from _impl.utils import cache, cli, log, utils
+from _impl.core import daemon, planner, workers
+from _impl.utils import cache, cli, client, instrumentation, log, utils
 
 
 def main():
@@ -25,20 +34,33 @@ def main():
     cmd = cli.Command()
     cmd.parse()
 
-    cache_obj = cache.Cache()
-    # query the cache with args
-    cache_value = cache_obj.get(cmd)
-    if cache_value:
-        # output result
-        cmd.display_output(cache_value)
+    instrumentation.enabled = cmd.execution_args['profile']
+    if cmd.execution_args['cprofile']:
+        instrumentation.profile_threads()
+
+    if cmd.execution_args['daemon']:
+        daemon.Daemon(cmd.logs_dir).serve()
         return
 
+    if not any([cmd.execution_args[arg] for arg in ('follow', 'profile', 'cprofile', 'sidecars')]):
+        results = client.query(client.create_request(cmd))
+        if results is not None:
+            cmd.display_output(results)
+            return
+
     # collect the data stores
-    data_stores = list(utils.collect_data_stores(cmd.logs_dir))
-    if not data_stores:
-        log.log.error('No data stores found in {}'.format(cmd.logs_dir))
+    data_stores = list(utils.collect_data_stores(cmd.logs_dir, date_range=cmd.date_args))
+    if not data_stores and not cmd.execution_args['follow']:
+        log.log.error('No data stores found in %s', cmd.logs_dir)
         return
 
+    followed = []
+    if cmd.execution_args['follow'] and data_stores:
+        # the newest one is still growing, it's read by follow()
+        newest = max(data_stores, key=lambda data_store: data_store.store_path)
+        data_stores.remove(newest)
+        followed.append(newest)
+
     # convert args to objects
     filters_objs = [
         filters.FilterFactory.create(name, value)
@@ -46,30 +68,193 @@ def main():
     ]
 
     aggregator_objs = [
-        aggregators.AggregateFactory.create(name)
+        aggregators.AggregateFactory.create(name, cmd.group_args)
         for name in cmd.aggregator_args
     ]
 
-    # Retrieve the records
-    r_pool = workers.RetrievalPool(list(data_stores))
-    # Filter records
-    f_pool = workers.FilterPool(filters_objs)
-    # Aggregate the result
-    a_pool = workers.AggregatorPool(aggregator_objs)
+    # query the cache for the unchanged data stores,
+    # only the new or changed ones need to be scanned
+    partial_cache = cache.PartialCache(cache.Cache(), cmd.filter_args)
+    partials, data_stores = partial_cache.lookup(data_stores, aggregator_objs)
 
-    r_pool.join()
-    f_pool.join()
-    a_pool.join()
+    if data_stores:
+        try:
+            scanned_partials = scan(data_stores, filters_objs, aggregator_objs, cmd.execution_args)
+        except Exception as error:
+            # the results of a failed scan are incomplete, never cache them
+            log.log.error('Scan failed for %s: %s', cmd.logs_dir, error)
+            sys.exit('Scan failed: {}'.format(error))
+        # write to cache
+        partial_cache.update(data_stores, aggregator_objs, scanned_partials)
+        partials.update(scanned_partials)
+    elif instrumentation.enabled:
+        # every data store was a partial cache hit
+        instrumentation.report([])
 
-    log.log.info('For Args : {}, {}, {}'.format(
-        cmd.logs_dir, cmd.filter_args, cmd.aggregator_args
-    ))
-    log.log.info('Final Results : {}'.format(a_pool.results))
+    results = workers.final_results(aggregator_objs, partials.values())
+
+    log.log.info('For Args : %s, %s, %s', cmd.logs_dir, cmd.filter_args, cmd.aggregator_args)
+    log.log.info('Final Results : %s', results)
+
+    if cmd.execution_args['follow']:
+        follow(cmd, followed, partials, filters_objs, aggregator_objs)
+        return
 
-    # write to cache
-    cache_obj.set(cmd, a_pool.results)
     # output the result
-    cmd.display_output(a_pool.results)
+    cmd.display_output(results)
+
+    if config.Sidecar.enabled and cmd.execution_args['sidecars']:
+        # large data stores without a sidecar were read in byte ranges,
+        # building their sidecars parses them again, only when asked to.
+        for data_store in data_stores:
+            data_store.get_sidecar()
+
+    if cmd.execution_args['cprofile']:
+        instrumentation.dump_profile(cmd.execution_args['cprofile'])
+
+
+def scan(data_stores, filters_objs, aggregator_objs, execution_args):
+    """ Retrieve, filter and aggregate the records of data stores.
+
+        Args:
+            data_stores (list): orm engines of the data stores.
+            filters_objs (list): filters of the query.
+            aggregator_objs (list): aggregators of the query.
+            execution_args (dict): how to execute the query.
+
+        Returns:
+            dict: {data store: {aggregator: [first stage result]}}
+    """
+    # filters on string columns are checked by the engine on raw rows
+    pushdown_filters = [f for f in filters_objs if f.pushdown]
+    remaining_filters = [f for f in filters_objs if not f.pushdown]
+
+    # only decode the columns needed after retrieval
+    projection = engine.projection(remaining_filters + aggregator_objs)
+
+    # units of work, large data stores are split in byte ranges
+    units = utils.schedule(data_stores)
+
+    # size the workers and batches
+    plan = planner.create(execution_args['concurrency'], units, remaining_filters)
+    log.log.info('Concurrency plan (%s, %s executor): %s',
+                 execution_args['concurrency'], execution_args['executor'], plan)
+
+    if execution_args['executor'] == 'process':
+        # Retrieve, filter and aggregate per shard in processes
+        p_pool = workers.ProcessPool(
+            units, pushdown_filters, remaining_filters,
+            projection, aggregator_objs, plan.processes
+        )
+        p_pool.join()
+        if instrumentation.enabled:
+            instrumentation.report([('map', p_pool.stats, None)])
+        return p_pool.partials
+    else:
+        # Retrieve the records
+        r_pool = workers.RetrievalPool(
+            units, pushdown_filters, projection, plan.retriever_threads,
+            plan.batch_size, plan.queue_size, plan.prefetch_count
+        )
+        # Filter records
+        f_pool = workers.FilterPool(
+            remaining_filters, r_pool.output, plan.filter_threads,
+            plan.queue_size, plan.prefetch_count
+        )
+        # Aggregate the result
+        a_pool = workers.AggregatorPool(aggregator_objs, f_pool.output, plan.aggregator_threads)
+        # adjust the pools while they run
+        tuner = None
+        if execution_args['concurrency'] == 'auto':
+            tuner = workers.Tuner(plan, r_pool, f_pool, a_pool)
+
+        r_pool.join()
+        f_pool.join()
+        if tuner is not None:
+            # no more workers once the aggregators are being joined
+            tuner.stop()
+        a_pool.join()
+        if instrumentation.enabled:
+            instrumentation.report([
+                ('retrieval', r_pool.stats, r_pool.output.high_water),
+                ('filter', f_pool.stats, f_pool.output.high_water),
+                ('aggregator', a_pool.stats, None),
+            ])
+        return a_pool.partials
+
+
+def follow(cmd, data_stores, partials, filters_objs, aggregator_objs):
+    """ Follow the growing data stores, only the rows appended
+        since the previous read are retrieved, filtered and aggregated.
+        Data stores created later on are followed as well.
+
+        Runs until interrupted.
+
+        Args:
+            cmd (Command): parsed cli args.
+            data_stores (list): orm engines of the data stores to follow,
+                                e.g. the newest one.
+            partials (dict): {data store: {aggregator: [first stage result]}}
+                             of the data stores which aren't followed,
+                             updated in place.
+            filters_objs (list): filters of the query.
+            aggregator_objs (list): aggregators of the query.
+    """
+    interval = cmd.execution_args['interval'] or config.Follow.interval
+    pushdown_filters = [f for f in filters_objs if f.pushdown]
+    remaining_filters = [f for f in filters_objs if not f.pushdown]
+    projection = engine.projection(remaining_filters + aggregator_objs)
+    kernel = aggregators.FusedAggregation(aggregator_objs)
+
+    # data store to (offset read upto, first stage result per aggregator)
+    offsets = {}
+    followed = dict((data_store.store_path, data_store) for data_store in data_stores)
+
+    # output on the first round, even if nothing is followed yet
+    rows_read = True
+    try:
+        while True:
+            # pick up the newly created data stores, named after later dates
+            newest = max(followed) if followed else ''
+            for data_store in utils.collect_data_stores(cmd.logs_dir, date_range=cmd.date_args):
+                if data_store.store_path > newest:
+                    followed[data_store.store_path] = data_store
+
+            for store_path, data_store in followed.iteritems():
+                offset, results = offsets.get(store_path, (0, [None] * len(aggregator_objs)))
+                size = os.path.getsize(store_path)
+                if size == offset:
+                    continue
+                truncated = size < offset
+                if truncated:
+                    # start over
+                    offset, results = 0, [None] * len(aggregator_objs)
+
+                read_to, batches = data_store.read_appended_record_batches(
+                    offset, filters=pushdown_filters, projection=projection
+                )
+                if read_to == offset and not truncated:
+                    # only a partially written line so far
+                    continue
+                results = workers.aggregate_batches(batches, remaining_filters, kernel, results)
+                offsets[store_path] = (read_to, results)
+                partials[store_path] = dict(
+                    (aggregator, [result])
+                    for aggregator, result in zip(aggregator_objs, results)
+                    if result is not None
+                )
+                rows_read = True
+
+            if rows_read:
+                results = workers.final_results(aggregator_objs, partials.values())
+                log.log.info('Follow Results : %s', results)
+                cmd.display_output(results)
+                sys.stdout.flush()
+                rows_read = False
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == '__main__':